@@ -0,0 +1,149 @@
+"""
+Runs the pipeline one step at a time and reports, for every step, its wall time,
+peak memory allocated while it ran (tracemalloc), how many of its input columns
+its output does not share (copied or rewritten), and whether it changed the
+frame it was given. Under copy-on-write, steps that only add columns should
+share every input column and leave their input untouched; row filters (spatial)
+necessarily copy.
+
+Run from the repository root:
+    python -m benchmarks.stage_memory --data "data/UNSW F12024.csv"
+"""
+
+import argparse
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from functools import partial
+from pipeline.cleaning import cleaning
+from pipeline.pipeline import copy_on_write
+from pipeline.spatial import spatial
+from pipeline.summary_eng import summary_eng
+from pipeline.targets import targets
+from pipeline.rolling import rolling_features
+from pipeline.loading import read_process_line
+from pipeline.telemetry_eng import (
+    brake_throttle,
+    compute_turning_window,
+    geometry_features,
+    interpolate_wheel_angle,
+    racing_line_deviation,
+    recompute_velocity_and_gforce,
+)
+
+
+def column_buffers(df):
+    """
+    numpy array behind each numpy-typed column. Extension columns (e.g. the
+    arrow-backed strings of pandas 3) build a new array on every to_numpy and
+    are left out.
+    """
+    return {
+        col: df[col].to_numpy()
+        for col in df.columns
+        if isinstance(df[col].dtype, np.dtype) and df[col].dtype != object
+    }
+
+
+def stage_report(step, df, *args):
+    """
+    Run step(df, *args), whose first result is the new frame, and return the
+    result with its wall time, peak traced memory, the input's memory, the
+    numpy input columns it kept, those of them it copied or rewrote, and
+    whether it changed its input.
+    """
+    before = column_buffers(df)
+    columns = list(df.columns)
+    frame_bytes = df.memory_usage(index=False).sum()
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = step(df, *args)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    out = result[0] if isinstance(result, tuple) else result
+    kept = [c for c in before if c in out.columns]
+    copied = [c for c in kept if not np.may_share_memory(before[c], out[c].to_numpy())]
+
+    # Under copy-on-write a write into the input gives the column a new buffer
+    mutated = list(df.columns) != columns or any(
+        not np.may_share_memory(df[c].to_numpy(), before[c]) for c in before
+    )
+
+    return result, {
+        "seconds": seconds,
+        "peak": peak,
+        "input_bytes": frame_bytes,
+        "kept": kept,
+        "copied": copied,
+        "new": list(out.columns.difference(columns)),
+        "mutated": mutated,
+    }
+
+
+def measure(name, step, df, *args):
+    """Run step(df, *args), whose first result is the new frame, and report on it."""
+    result, report = stage_report(step, df, *args)
+    print(
+        f"{name:<32} {report['seconds']:8.2f} s  peak {report['peak'] / 1e6:9.1f} MB "
+        f"(input {report['input_bytes'] / 1e6:8.1f} MB)  "
+        f"copied {len(report['copied']):3d}/{len(report['kept']):3d} columns"
+        f"  new {len(report['new']):3d}"
+        f"  {'MUTATED INPUT' if report['mutated'] else ''}"
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--data", help="Raw telemetry CSV (default: data/UNSW F12024.csv)"
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["numpy", "numba"],
+        default="numpy",
+        help="Geometry backend",
+    )
+    args = parser.parse_args()
+
+    with copy_on_write():
+        run_steps(args)
+
+
+def run_steps(args):
+    print(f"pandas {pd.__version__}, copy-on-write on\n")
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    df = cleaning(args.data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{'cleaning':<32} {time.perf_counter() - start:8.2f} s  peak {peak / 1e6:9.1f} MB"
+    )
+
+    df, _, _ = measure("spatial", spatial, df)
+    line = read_process_line()
+
+    steps = [
+        ("compute_turning_window", compute_turning_window),
+        ("interpolate_wheel_angle", interpolate_wheel_angle),
+        ("racing_line_deviation", partial(racing_line_deviation, line=line)),
+        ("brake_throttle", brake_throttle),
+        ("recompute_velocity_and_gforce", recompute_velocity_and_gforce),
+        ("geometry_features", partial(geometry_features, backend=args.backend)),
+        ("rolling_features", partial(rolling_features, backend=args.backend)),
+    ]
+    for name, step in steps:
+        df = measure(name, step, df)
+
+    df, summary = measure("summary_eng", summary_eng, df)
+    measure("targets", targets, df, summary)
+
+
+if __name__ == "__main__":
+    main()
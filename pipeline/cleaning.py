@@ -1,42 +1,191 @@
 import pandas as pd
+import numpy as np
 import logging
+from functools import partial
 from .loading import read_data
+from .ingest import pipelined_map, read_chunks
+from .tracks import MELBOURNE
 
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
-)
 logger = logging.getLogger(__name__)
 
+REDUNDANT_COLS = [
+    "CREATED_ON",
+    "GAMEHOST",
+    "DEVICENAME",
+    "SESSION_GUID",
+    "R_SESSION",
+    "R_GAMEHOST",
+    "M_PACKETFORMAT",
+    "M_GAMEMAJORVERSION",
+    "M_GAMEMINORVERSION",
+    "M_FRAMEIDENTIFIER",
+    "R_STATUS",
+    "M_CURRENTLAPNUM_1",
+    "M_TRACKID",
+    "R_TRACKID",
+    "M_LAPINVALID",
+    "M_SECTOR1TIMEMSPART_1",
+    "M_SECTOR1TIMEMINUTESPART_1",
+    "M_SECTOR2TIMEMSPART_1",
+    "M_SECTOR2TIMEMINUTESPART_1",
+    "M_SECTOR_1",
+    "M_CURRENTLAPINVALID_1",
+    "M_DRIVERSTATUS_1",
+    "FRAMEID",
+    "M_TOTALLAPS",
+    "M_SESSIONTYPE",
+    "R_FAV_TEAM",
+    "M_TYRESSURFACETEMPERATURE_RL_1",
+    "M_TYRESSURFACETEMPERATURE_RR_1",
+    "M_TYRESSURFACETEMPERATURE_FL_1",
+    "M_TYRESSURFACETEMPERATURE_FR_1",
+    "M_TYRESINNERTEMPERATURE_RL_1",
+    "M_TYRESINNERTEMPERATURE_RR_1",
+    "M_TYRESINNERTEMPERATURE_FL_1",
+    "M_TYRESINNERTEMPERATURE_FR_1",
+    "M_ENGINETEMPERATURE_1",
+]
 
-def cleaning():
-    df = read_data()
-    logger.info("Data loaded.")
+# Redundant columns the lap filter still needs (planner.INVALID_FLAGS), so they
+# are only dropped after it has run
+LAP_FILTER_COLS = ["M_LAPINVALID", "M_CURRENTLAPINVALID_1"]
 
-    # Removes laps from trakcs that are not melbourne
-    df = filter_melbourne(df)
-    logger.info("Filtered Melbourne laps.")
+# Frame identifiers, only dropped after repair_frames has collapsed duplicates
+FRAME_COLS = ["M_FRAMEIDENTIFIER", "FRAMEID"]
 
-    # Removes rows with NA (X,Y) coordinates
-    df = remove_na(df)
-    logger.info("Removed data points with missing x or y co-ordinates.")
+# Telemetry is sent at up to 60 Hz (~16 ms apart). A row less than MIN_FRAME_MS
+# after the previous one of its lap is a re-sent frame; a step of more than
+# MAX_FRAME_GAP_MS means frames were lost.
+MIN_FRAME_MS = 5
+MAX_FRAME_GAP_MS = 100
+
+
+def cleaning(
+    path=None,
+    chunk_size=None,
+    lap_filter=None,
+    track_id=MELBOURNE,
+    raw=None,
+    workers=1,
+):
+    """
+    Load the raw telemetry and clean it. lap_filter, when given, replaces
+    remove_stuttery_laps: it is called on the re-indexed frame while the raw
+    lap flags are still present (see planner.reject_laps).
+
+    With chunk_size the CSV is read in chunks and the next chunk is parsed while
+    workers threads filter and prune the previous ones (see ingest.read_chunks).
+
+    raw takes rows already routed to track_id with missing positions removed
+    (see read_tracks), in which case path is not read.
+    """
+    if raw is not None:
+        df = raw
+    elif chunk_size:
+        # Filter each chunk as it is read so only this track's rows are held in memory
+        df = read_chunks(
+            path,
+            chunk_size,
+            partial(prepare_chunk, track_id=track_id),
+            workers=workers,
+        )
+        logger.info(
+            f"Data loaded in chunks, filtered track {track_id} laps and missing x or y."
+        )
+    else:
+        df = read_data(path)
+        logger.info("Data loaded.")
+
+        # Removes laps from other tracks
+        df = filter_track(df, track_id)
+        logger.info(f"Filtered track {track_id} laps.")
+
+        # Removes rows with NA (X,Y) coordinates
+        df = remove_na(df)
+        logger.info("Removed data points with missing x or y co-ordinates.")
 
     # Re-index the laps for easier access
     df = re_index(df)
     logger.info("Re-indexed data.")
 
+    if lap_filter is not None:
+        df = lap_filter(df)
+        logger.info("Removed rejected laps.")
+    else:
+        df = remove_stuttery_laps(df)
+        logger.info("Removed bad lap data.")
+
+    # Collapses duplicate frames of the kept laps while the frame ids are present.
+    # Laps are rejected on the recorded rows, so repairing does not change which
+    # laps are kept.
+    df = repair_frames(df)
+
     # Removing uselss/redundant columns from the data
     df = remove_redundant_cols(df)
     logger.info("Removed redundant columns")
 
-    df = remove_stuttery_laps(df)
-    logger.info("Removed bad lap data.")
-
     return df
 
 
+def read_tracks(path=None, track_ids=None, chunk_size=None, workers=1):
+    """
+    Scan the raw telemetry once and route its rows by M_TRACKID into one frame
+    per track, with missing positions removed. track_ids restricts the tracks
+    kept (default: every track in the data). With chunk_size, chunks are routed
+    by workers threads while the next chunk is parsed.
+    """
+    route = partial(route_chunk, track_ids=track_ids)
+    if chunk_size:
+        chunks = read_data(path, chunk_size=chunk_size)
+        routed = pipelined_map(chunks, route, workers=workers)
+    else:
+        routed = [route(read_data(path))]
+
+    parts = {}
+    for groups in routed:
+        for track_id, rows in groups.items():
+            parts.setdefault(track_id, []).append(rows)
+
+    partitions = {
+        track_id: pd.concat(rows, ignore_index=True)
+        for track_id, rows in sorted(parts.items())
+    }
+    logger.info(
+        f"Routed raw data to {len(partitions)} tracks: "
+        + ", ".join(f"{t} ({len(df)} rows)" for t, df in partitions.items())
+    )
+    return partitions
+
+
+def route_chunk(chunk, track_ids=None):
+    """Split a chunk into {track_id: rows} with missing positions removed."""
+    if track_ids is not None:
+        chunk = chunk[chunk["M_TRACKID"].isin(track_ids)]
+    return {
+        int(track_id): remove_na(rows)
+        for track_id, rows in chunk.groupby("M_TRACKID", sort=False)
+    }
+
+
+def prepare_chunk(chunk, track_id=MELBOURNE):
+    """
+    Per-chunk part of cleaning: keep the track's rows with a position and drop
+    the redundant columns nothing before remove_redundant_cols reads.
+    """
+    chunk = remove_na(filter_track(chunk, track_id))
+    keep = LAP_FILTER_COLS + FRAME_COLS
+    prune = [c for c in REDUNDANT_COLS if c in chunk.columns and c not in keep]
+    return chunk.drop(columns=prune)
+
+
+def filter_track(df, track_id=MELBOURNE):
+    """Keep only laps from the given circuit."""
+    return df[df["M_TRACKID"] == track_id]
+
+
 def filter_melbourne(df):
     """Keep only laps from the Melbourne circuit."""
-    return df[df["M_TRACKID"] == 0]
+    return filter_track(df, MELBOURNE)
 
 
 def remove_na(df):
@@ -45,83 +194,192 @@ def remove_na(df):
     )
 
 
-def remove_stuttery_laps(df, min_points=500):
-    # Drop duplicate positions within each lap
-    df_unique = df.drop_duplicates(
-        subset=["lap_index", "M_WORLDPOSITIONX_1", "M_WORLDPOSITIONY_1"]
-    )
+def remove_stuttery_laps(
+    df, min_points=500, max_repeated_fraction=None, max_frozen_run=None, metrics=None
+):
+    """
+    Remove laps with fewer than min_points distinct (x, y) positions, and optionally
+    laps whose repeated_fraction or longest_frozen_run exceed the given limits.
 
-    # Count distinct points per lap
-    lap_counts = df_unique.groupby("lap_index").size().reset_index(name="n_points")
+    Pass precomputed stutter_metrics(df) as metrics to try different thresholds
+    without recomputing them.
+    """
+    if metrics is None:
+        metrics = stutter_metrics(df)
 
     # Keep only laps with enough distinct points
-    valid_laps = lap_counts[lap_counts["n_points"] >= min_points]["lap_index"]
+    valid = metrics["n_points"] >= min_points
+    if max_repeated_fraction is not None:
+        valid &= metrics["repeated_fraction"] <= max_repeated_fraction
+    if max_frozen_run is not None:
+        valid &= metrics["longest_frozen_run"] <= max_frozen_run
+
+    valid_laps = metrics.loc[valid, "lap_index"]
     df_clean = df[df["lap_index"].isin(valid_laps)]
 
     return df_clean
 
 
+def stutter_metrics(df):
+    """
+    Per-lap stutter metrics, computed without copying or deduplicating the frame:
+        - n_rows: telemetry rows in the lap
+        - n_points: distinct (x, y) positions in the lap
+        - repeated_fraction: share of rows that repeat an earlier position of the lap
+        - longest_frozen_run: longest run of consecutive rows stuck on one position
+
+    Distinct positions are counted by factorizing x and y to integer codes and
+    packing (lap, x, y) losslessly into one int64 key per row. Frozen runs follow
+    the recorded row order.
+    """
+    lap_codes, laps = pd.factorize(df["lap_index"])
+    n_laps = len(laps)
+
+    x = df["M_WORLDPOSITIONX_1"].to_numpy(dtype=np.float64)
+    y = df["M_WORLDPOSITIONY_1"].to_numpy(dtype=np.float64)
+
+    key_codes, uniques = pd.factorize(pack_position_keys(lap_codes, x, y))
+
+    # Each distinct key belongs to exactly one lap
+    key_lap = np.empty(len(uniques), dtype=np.int64)
+    key_lap[key_codes] = lap_codes
+
+    n_rows = np.bincount(lap_codes, minlength=n_laps)
+    n_points = np.bincount(key_lap, minlength=n_laps)
+
+    # Runs of consecutive rows with the same lap and position
+    same = (lap_codes[1:] == lap_codes[:-1]) & (x[1:] == x[:-1]) & (y[1:] == y[:-1])
+    run_starts = np.flatnonzero(np.r_[True, ~same])
+    run_lengths = np.diff(np.r_[run_starts, len(x)])
+    longest = np.zeros(n_laps, dtype=np.int64)
+    np.maximum.at(longest, lap_codes[run_starts], run_lengths)
+
+    return pd.DataFrame(
+        {
+            "lap_index": np.asarray(laps),
+            "n_rows": n_rows,
+            "n_points": n_points,
+            "repeated_fraction": 1 - n_points / n_rows,
+            "longest_frozen_run": longest,
+        }
+    )
+
+
+def pack_position_keys(lap_codes, x, y):
+    """
+    One int64 key per row, equal exactly when lap, x and y are all equal.
+    (lap, x) pairs are factorized first so no packed value can exceed the row count
+    times the number of distinct y values.
+    """
+    x_codes, x_uniques = pd.factorize(x, use_na_sentinel=False)
+    y_codes, y_uniques = pd.factorize(y, use_na_sentinel=False)
+    lap_x, _ = pd.factorize(lap_codes.astype(np.int64) * len(x_uniques) + x_codes)
+    return lap_x.astype(np.int64) * len(y_uniques) + y_codes
+
+
 def re_index(df):
-    """Add a global 0-based lap index per unique session/lap combination."""
+    """
+    Add a global 0-based lap index per unique session/lap combination, numbered
+    in (session, lap) order. Only the lap_index column is new; the existing
+    columns are shared with df rather than copied.
+    """
+    lap_index = df.groupby(
+        ["M_SESSIONUID", "M_CURRENTLAPNUM"], sort=True, dropna=False
+    ).ngroup()
 
-    # Drop duplicates to get unique session/lap pairs in order
-    unique_laps = df[["M_SESSIONUID", "M_CURRENTLAPNUM"]].drop_duplicates()
+    return df.assign(lap_index=lap_index).reset_index(drop=True)
 
-    # Sort by session, then lap
-    unique_laps = unique_laps.sort_values(["M_SESSIONUID", "M_CURRENTLAPNUM"])
 
-    # Assign a global 0-based index
-    unique_laps["lap_index"] = range(len(unique_laps))
+def repair_frames(
+    df, lap_cols="lap_index", min_frame_ms=MIN_FRAME_MS, max_gap_ms=MAX_FRAME_GAP_MS
+):
+    """
+    Collapse duplicate frames and flag gaps in each lap, in recorded order:
+        - rows repeating the frame identifier (FRAME_COLS), time and position of
+          an earlier row of their lap are re-sent frames and dropped
+        - rows a later row of their lap rewinds past (M_CURRENTLAPTIMEINMS_1 going
+          back, e.g. a flashback) were abandoned and are dropped, so the lap keeps
+          the timeline that was driven on
+        - rows less than min_frame_ms after the previous kept row of their lap
+          are dropped
+        - frame_gap marks rows more than max_gap_ms after the previous kept row
+
+    Kept rows of a lap are therefore in time order and at least min_frame_ms
+    apart, so the rates derived from them (recompute_velocity_and_gforce) stay
+    finite.
+    """
+    n_rows = len(df)
+
+    # Identifiers go back on a flashback, so a repeated identifier alone does not
+    # make a row a copy
+    keys = [lap_cols] if isinstance(lap_cols, str) else list(lap_cols)
+    keys += [c for c in FRAME_COLS if c in df.columns][:1]
+    keys += ["M_CURRENTLAPTIMEINMS_1", "M_WORLDPOSITIONX_1", "M_WORLDPOSITIONY_1"]
+    df = df[~df.duplicated(keys)]
+    n_resent = n_rows - len(df)
 
-    # Map the lap_index back to all rows in the original dataframe
-    df = df.merge(unique_laps, on=["M_SESSIONUID", "M_CURRENTLAPNUM"], how="left")
+    # Earliest time recorded after each row in its lap
+    lap = df.groupby(lap_cols, sort=False).ngroup()
+    time = df["M_CURRENTLAPTIMEINMS_1"]
+    backwards = time.iloc[::-1].groupby(lap.iloc[::-1])
+    later = backwards.cummin().groupby(lap.iloc[::-1]).shift().iloc[::-1]
+    abandoned = time >= later
+    df, lap, time = df[~abandoned], lap[~abandoned], time[~abandoned]
 
+    spaced = frame_spacing_mask(lap.to_numpy(), time.to_numpy(), min_frame_ms)
+    close = ~spaced
+    df, lap, time = df[spaced], lap[spaced], time[spaced]
+
+    df = df.assign(frame_gap=time.groupby(lap).diff() > max_gap_ms)
+
+    logger.info(
+        f"Dropped {n_resent + int(close.sum())} duplicate frames and "
+        f"{int(abandoned.sum())} rows rewound by a flashback, flagged "
+        f"{int(df['frame_gap'].sum())} gaps of more than {max_gap_ms} ms."
+    )
     return df
 
 
+def frame_spacing_mask(lap, time, min_gap):
+    """
+    Rows kept when each lap keeps its first row and then every row at least
+    min_gap after the previous kept row, in time order.
+
+    The next candidate of every row is found with one searchsorted over
+    (lap, time) keys; the kept chains are then followed from every lap's first
+    row at once, one kept row per lap per step.
+    """
+    time = np.asarray(time, dtype=np.float64)
+    keep = ~np.isfinite(time)  # rows without a time are left alone
+    rows = np.flatnonzero(~keep)
+    if not len(rows):
+        return keep
+
+    order = rows[np.lexsort((time[rows], lap[rows]))]
+    lap, time = lap[order], time[order]
+
+    # Offset each lap into its own disjoint time range so one sorted key covers all laps
+    span = time.max() - time.min() + min_gap + 1.0
+    key = lap * span + (time - time.min())
+    nxt = np.searchsorted(key, key + min_gap, side="left")
+    nxt = np.maximum(nxt, np.arange(1, len(key) + 1))  # always move forward
+
+    current = np.flatnonzero(np.r_[True, lap[1:] != lap[:-1]])
+    while len(current):
+        keep[order[current]] = True
+        following = nxt[current]
+        valid = following < len(order)
+        current, following = current[valid], following[valid]
+        current = following[lap[following] == lap[current]]
+    return keep
+
+
 def remove_redundant_cols(df):
     """
     REDUNDANT VARIABLES: Removes session metadata, duplicates, and irrelevant columns that are either
     redundant, empty, or not needed for modeling/analysis, leaving only clean and relevant features.
     """
-    red_cols = [
-        "CREATED_ON",
-        "GAMEHOST",
-        "DEVICENAME",
-        "SESSION_GUID",
-        "R_SESSION",
-        "R_GAMEHOST",
-        "M_PACKETFORMAT",
-        "M_GAMEMAJORVERSION",
-        "M_GAMEMINORVERSION",
-        "M_FRAMEIDENTIFIER",
-        "R_STATUS",
-        "M_CURRENTLAPNUM_1",
-        "M_TRACKID",
-        "R_TRACKID",
-        "M_LAPINVALID",
-        "M_SECTOR1TIMEMSPART_1",
-        "M_SECTOR1TIMEMINUTESPART_1",
-        "M_SECTOR2TIMEMSPART_1",
-        "M_SECTOR2TIMEMINUTESPART_1",
-        "M_SECTOR_1",
-        "M_CURRENTLAPINVALID_1",
-        "M_DRIVERSTATUS_1",
-        "FRAMEID",
-        "M_TOTALLAPS",
-        "M_SESSIONTYPE",
-        "R_FAV_TEAM",
-        "M_TYRESSURFACETEMPERATURE_RL_1",
-        "M_TYRESSURFACETEMPERATURE_RR_1",
-        "M_TYRESSURFACETEMPERATURE_FL_1",
-        "M_TYRESSURFACETEMPERATURE_FR_1",
-        "M_TYRESINNERTEMPERATURE_RL_1",
-        "M_TYRESINNERTEMPERATURE_RR_1",
-        "M_TYRESINNERTEMPERATURE_FL_1",
-        "M_TYRESINNERTEMPERATURE_FR_1",
-        "M_ENGINETEMPERATURE_1",
-    ]
-
-    df = df.drop(columns=red_cols)
+    # Columns already pruned per chunk at ingest are skipped
+    df = df.drop(columns=[c for c in REDUNDANT_COLS if c in df.columns])
 
     return df
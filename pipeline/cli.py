@@ -0,0 +1,243 @@
+import argparse
+import os
+import shutil
+import time
+
+FORMATS = ["csv", "npy", "both"]
+
+
+def build_parser():
+    # Imported here so `--help` does not pay for pandas
+    from .pipeline import STAGES
+
+    parser = argparse.ArgumentParser(
+        description="Build the Albert Park T1-T2 telemetry and lap summary data products."
+    )
+    parser.add_argument(
+        "--data", help="Raw telemetry CSV (default: data/UNSW F12024.csv)"
+    )
+    parser.add_argument(
+        "--left", help="Left track limit CSV (default: data/f1sim-ref-left.csv)"
+    )
+    parser.add_argument(
+        "--right", help="Right track limit CSV (default: data/f1sim-ref-right.csv)"
+    )
+    parser.add_argument(
+        "--line", help="Racing line CSV (default: data/f1sim-ref-line.csv)"
+    )
+    parser.add_argument(
+        "--output-dir", default="output", help="Directory for outputs (default: output)"
+    )
+    parser.add_argument(
+        "--format",
+        choices=FORMATS,
+        default="both",
+        help="csv files, npy column stores or both (default: both)",
+    )
+    parser.add_argument(
+        "--stages",
+        default=",".join(STAGES),
+        help=f"Comma separated consecutive stages to run, from {','.join(STAGES)} (default: all)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Worker processes for spatial filtering (and threads for chunked reading)",
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, help="Read the raw CSV in chunks of this many rows"
+    )
+    parser.add_argument(
+        "--slicer",
+        choices=["polygon", "gates"],
+        default="polygon",
+        help="Cut the sector with the slice polygon or at the start/finish cut lines",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["auto", "numpy", "numba"],
+        default="auto",
+        help="Implementation of the per-row geometry features (default: numba if installed)",
+    )
+    parser.add_argument(
+        "--tracks",
+        default="0",
+        help="Comma separated M_TRACKIDs from the track registry, or 'all'; several "
+        "tracks share one read of the raw CSV and write to <output-dir>/<track name> "
+        "(default: 0, Albert Park)",
+    )
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="Reject stuttery and off-track laps before the spatial stage and write rejections.csv",
+    )
+    parser.add_argument(
+        "--training-dir",
+        help="Also export memory-mapped training tensors (scalars, corner windows, "
+        "target, session split) here",
+    )
+    parser.add_argument(
+        "--pyramid",
+        action="store_true",
+        help="Also write a 1/4/16/64x min/max/mean pyramid of the lap traces to "
+        "<output-dir>/pyramid for zoomable plots (see pipeline.pyramid.query_pyramid)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="Save each stage's output here and resume later stages from it",
+    )
+    return parser
+
+
+def write_outputs(outputs, output_dir, fmt):
+    """Write each non-empty output frame as CSV and/or a column store, replacing old files."""
+    from .column_store import write_column_store
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    for name, frame in outputs.items():
+        if frame is None:
+            continue
+
+        csv_path = os.path.join(output_dir, f"{name}.csv")
+        store_path = os.path.join(output_dir, f"{name}_columns")
+
+        if fmt in ("csv", "both"):
+            if os.path.exists(csv_path):
+                os.remove(csv_path)
+            frame.to_csv(csv_path, index=False)
+
+        # Track limits and racing line are small, so they are kept as CSV only
+        if fmt in ("npy", "both") and name in ("telemetry", "summary"):
+            if os.path.exists(store_path):
+                shutil.rmtree(store_path)
+            lap_col = "lap_index" if name == "telemetry" else None
+            write_column_store(frame, store_path, lap_col=lap_col)
+
+
+def print_timings(timings, title="Stage timings"):
+    total = sum(timings.values())
+    width = max(len(name) for name in timings)
+    print(f"\n{title}:")
+    for name, seconds in timings.items():
+        print(f"  {name:<{width}}  {seconds:8.2f} s")
+    print(f"  {'total':<{width}}  {total:8.2f} s")
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    from .pipeline import data_pipeline, multi_track_pipeline
+    from .tracks import TRACKS
+
+    options = dict(
+        stages=[s.strip() for s in args.stages.split(",") if s.strip()],
+        backend=args.backend,
+        slicer=args.slicer,
+        plan=args.plan,
+    )
+
+    if args.tracks.strip() == "all":
+        track_ids = None
+    else:
+        try:
+            track_ids = [int(t) for t in args.tracks.split(",") if t.strip()]
+        except ValueError:
+            parser.error(
+                f"--tracks expects comma separated integers or 'all', got {args.tracks!r}"
+            )
+        if not track_ids:
+            parser.error("--tracks needs at least one track id, or 'all'")
+
+    multi = track_ids is None or len(track_ids) > 1
+    if multi and (args.left or args.right or args.line):
+        parser.error(
+            "--left, --right and --line apply to a single track; "
+            "several tracks use the reference files of the track registry."
+        )
+
+    if not multi:
+        timings = {}
+        reports = {}
+        data, left, right, line, summary = data_pipeline(
+            data_path=args.data,
+            left_path=args.left,
+            right_path=args.right,
+            line_path=args.line,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            cache_dir=args.cache_dir,
+            timings=timings,
+            reports=reports,
+            track=track_ids[0],
+            **options,
+        )
+        results = {track_ids[0]: (data, left, right, line, summary, reports)}
+        track_timings = {}
+    else:
+        # Reference files come from the registry, one set per track
+        start = time.perf_counter()
+        outputs = multi_track_pipeline(
+            data_path=args.data,
+            track_ids=track_ids,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            cache_dir=args.cache_dir,
+            **options,
+        )
+        timings = {"tracks": time.perf_counter() - start}
+        results = {track_id: output[:-1] for track_id, output in outputs.items()}
+        track_timings = {track_id: output[-1] for track_id, output in outputs.items()}
+
+    def track_dir(root, track_id):
+        # Several tracks are written to one subdirectory per track
+        return os.path.join(root, TRACKS[track_id]["name"]) if multi else root
+
+    start = time.perf_counter()
+    for track_id, (data, left, right, line, summary, reports) in results.items():
+        write_outputs(
+            {
+                "telemetry": data,
+                "summary": summary,
+                "left": left,
+                "right": right,
+                "line": line,
+                **reports,
+            },
+            track_dir(args.output_dir, track_id),
+            args.format,
+        )
+    timings["write"] = time.perf_counter() - start
+
+    if args.training_dir:
+        from .training_export import export_training_matrix
+
+        start = time.perf_counter()
+        for track_id, (data, _, _, _, summary, _) in results.items():
+            if summary is None:
+                raise SystemExit("--training-dir needs the summary and targets stages.")
+            export_training_matrix(
+                data, summary, track_dir(args.training_dir, track_id), track=track_id
+            )
+        timings["training export"] = time.perf_counter() - start
+
+    if args.pyramid:
+        from .pyramid import build_pyramid
+
+        start = time.perf_counter()
+        for track_id, (data, *_) in results.items():
+            path = os.path.join(track_dir(args.output_dir, track_id), "pyramid")
+            if os.path.exists(path):
+                shutil.rmtree(path)
+            build_pyramid(data, path)
+        timings["pyramid"] = time.perf_counter() - start
+
+    for track_id, stage_timings in track_timings.items():
+        print_timings(stage_timings, f"Stage timings ({TRACKS[track_id]['name']})")
+    print_timings(timings)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+LAP_KEYS = "lap_keys.npy"
+LAP_OFFSETS = "lap_offsets.npy"
+
+
+def write_column_store(df, path, lap_col=None):
+    """
+    Write every column of df as its own flat .npy file inside the directory path,
+    together with a manifest recording the column order, dtypes and row count.
+
+    Text columns are stored as fixed-width unicode so that every file can be
+    memory-mapped without pickling.
+
+    With lap_col, the store is also indexed by lap: rows of each lap are made
+    contiguous (a stable sort, only if some lap is split) and the lap keys and
+    their row offsets are saved, so single laps can be read without a scan
+    (see lap_offsets and query.fetch_laps).
+    """
+    os.makedirs(path, exist_ok=True)
+
+    laps = None
+    if lap_col is not None:
+        codes, keys = pd.factorize(df[lap_col])
+        if len(lap_runs(codes)) > len(keys):
+            order = np.argsort(codes, kind="stable")
+            df, codes = df.iloc[order], codes[order]
+        np.save(os.path.join(path, LAP_KEYS), column_values(pd.Series(keys)))
+        np.save(os.path.join(path, LAP_OFFSETS), np.r_[lap_runs(codes), len(df)])
+        laps = {"column": lap_col, "keys": LAP_KEYS, "offsets": LAP_OFFSETS}
+
+    columns = []
+    for col in df.columns:
+        values = column_values(df[col])
+        filename = f"{len(columns):04d}.npy"
+        np.save(os.path.join(path, filename), values, allow_pickle=False)
+        columns.append({"name": col, "file": filename, "dtype": values.dtype.str})
+
+    manifest = {"n_rows": len(df), "columns": columns}
+    if laps is not None:
+        manifest["laps"] = laps
+    with open(os.path.join(path, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    logger.info(f"Wrote {len(columns)} columns to {path}.")
+    return manifest
+
+
+def lap_runs(codes):
+    """Start of every run of equal lap codes."""
+    return np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])[: len(codes)]
+
+
+def column_values(series):
+    """Convert a column into a contiguous numpy array that np.load can memory-map."""
+    if pd.api.types.is_bool_dtype(series) and not series.hasnans:
+        return np.ascontiguousarray(series.to_numpy(dtype=bool))
+
+    if pd.api.types.is_numeric_dtype(series):
+        # Nullable integer columns become floats so missing values survive as NaN
+        if series.hasnans and pd.api.types.is_integer_dtype(series):
+            return np.ascontiguousarray(series.to_numpy(dtype=float, na_value=np.nan))
+        return np.ascontiguousarray(series.to_numpy())
+
+    return series.fillna("").astype(str).to_numpy().astype(str)
+
+
+def read_manifest(path):
+    with open(os.path.join(path, MANIFEST)) as f:
+        return json.load(f)
+
+
+def load_column_store(path, columns=None):
+    """
+    Memory-map the columns of a store written by write_column_store.
+
+    Returns a dict of column name -> read-only np.memmap. Every process that
+    loads the same store shares one page-cache copy of the data, and nothing
+    is read from disk until a column is actually touched.
+    """
+    manifest = read_manifest(path)
+    files = {c["name"]: c["file"] for c in manifest["columns"]}
+
+    if columns is None:
+        columns = list(files)
+
+    missing = [c for c in columns if c not in files]
+    if missing:
+        raise KeyError(f"Columns not in column store {path}: {missing}")
+
+    return {
+        col: np.load(os.path.join(path, files[col]), mmap_mode="r") for col in columns
+    }
+
+
+def column_store_frame(path, columns=None):
+    """
+    Load a column store as a DataFrame whose columns are backed by the
+    memory-mapped files (one block per column, no consolidation copy).
+    """
+    arrays = load_column_store(path, columns)
+    return pd.DataFrame(arrays, copy=False)
+
+
+def lap_offsets(path):
+    """
+    Lap index of a store written with lap_col: (keys, offsets), where the rows
+    of lap keys[i] are offsets[i]:offsets[i + 1].
+    """
+    manifest = read_manifest(path)
+    if "laps" not in manifest:
+        raise KeyError(f"Column store {path} has no lap index; write it with lap_col.")
+    laps = manifest["laps"]
+    keys = np.load(os.path.join(path, laps["keys"]))
+    offsets = np.load(os.path.join(path, laps["offsets"]))
+    return keys, offsets
@@ -0,0 +1,177 @@
+import numpy as np
+import pandas as pd
+import logging
+from .targets import lap_segments
+from .tracks import get_track
+
+logger = logging.getLogger(__name__)
+
+PHASES = ["entry", "apex", "exit"]
+
+# Output column -> (input column, statistic)
+DEFAULT_REDUCTIONS = {
+    "entry_speed": ("M_SPEED_1", "first"),
+    "exit_speed": ("M_SPEED_1", "last"),
+    "min_speed": ("M_SPEED_1", "min"),
+    "mean_speed": ("M_SPEED_1", "mean"),
+    "time_in_phase_ms": ("M_CURRENTLAPTIMEINMS_1", "span"),
+    "peak_lateral_g": ("lateral_g", "absmax"),
+    "peak_brake": ("M_BRAKE_1", "max"),
+    "mean_throttle": ("M_THROTTLE_1", "mean"),
+}
+
+STATS = ["first", "last", "min", "max", "absmax", "sum", "mean", "count", "span"]
+
+
+def lateral_g(df):
+    """Component of the G-force perpendicular to the direction of travel (signed, left positive)."""
+    vx, vy = df["VEL_X"].to_numpy(), df["VEL_Y"].to_numpy()
+    gx, gy = df["GFORCE_X"].to_numpy(), df["GFORCE_Y"].to_numpy()
+    speed = np.hypot(vx, vy)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(speed > 0, (vx * gy - vy * gx) / speed, 0.0)
+
+
+def corner_phase_segments(df, track=None, apex_radius=10):
+    """
+    Labels every row inside a corner's turning window with its (lap, corner, phase)
+    and groups the labelled rows into contiguous segments.
+
+    Within each lap's pass through a window, the apex row is the closest approach
+    to the apex. Rows within apex_radius metres of the apex (and the apex row
+    itself) are the apex phase; earlier rows are entry and later rows exit. A row
+    inside two overlapping windows belongs to both corners.
+
+    Returns (rows, keys, starts, laps): row positions in segment order, the
+    (lap code, corner, phase) key of each segment, segment start offsets into
+    rows, and the lap_index of each lap code.
+    """
+    track = get_track(track)
+    laps, codes, order, _ = lap_segments(df)
+    x = df["M_WORLDPOSITIONX_1"].to_numpy(dtype=np.float64)[order]
+    y = df["M_WORLDPOSITIONY_1"].to_numpy(dtype=np.float64)[order]
+    sorted_codes = codes[order]
+
+    n_corners = len(track["corners"])
+    parts = []
+    for k, (ax, ay) in enumerate(track["corners"].values()):
+        dist = np.hypot(x - ax, y - ay)
+        w = np.flatnonzero(dist <= track["turn_radius"])
+        if not len(w):
+            continue
+        lap, d = sorted_codes[w], dist[w]
+
+        # Position of the closest approach within each lap's window rows
+        first = np.flatnonzero(np.r_[True, lap[1:] != lap[:-1]])
+        counts = np.diff(np.r_[first, len(w)])
+        nearest = np.repeat(np.minimum.reduceat(d, first), counts)
+        pos = np.arange(len(w))
+        apex_pos = np.minimum.reduceat(
+            np.where(d == nearest, pos, len(w)), first
+        ).repeat(counts)
+
+        phase = np.where(pos < apex_pos, 0, 2)
+        phase[(d <= apex_radius) | (pos == apex_pos)] = 1
+
+        for p in range(len(PHASES)):
+            in_phase = phase == p
+            key = (lap[in_phase] * n_corners + k) * len(PHASES) + p
+            parts.append((order[w[in_phase]], key))
+
+    if not parts:
+        empty = np.empty(0, np.int64)
+        return empty, empty, empty, laps
+
+    # Counting sort on the segment keys: bincount gives every segment's offset,
+    # and within one (corner, phase) part the rows of a segment are already a
+    # contiguous run in time order, so its rank is the position in that run
+    n_keys = len(laps) * n_corners * len(PHASES)
+    seg_counts = np.bincount(
+        np.concatenate([key for _, key in parts]), minlength=n_keys
+    )
+    offsets = np.cumsum(seg_counts) - seg_counts
+
+    rows = np.empty(seg_counts.sum(), dtype=np.int64)
+    for part_rows, key in parts:
+        if not len(key):
+            continue
+        run_starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+        run_lengths = np.diff(np.r_[run_starts, len(key)])
+        rank = np.arange(len(key)) - np.repeat(run_starts, run_lengths)
+        rows[offsets[key] + rank] = part_rows
+
+    keys = np.flatnonzero(seg_counts)
+    return rows, keys, offsets[keys], laps
+
+
+def segment_reduce(values, starts, stat):
+    """Reduce each contiguous segment of values (beginning at starts) with stat."""
+    if not len(starts):
+        return np.empty(0)
+
+    ends = np.r_[starts[1:], len(values)]
+    valid = (~np.isnan(values)).astype(np.int64)
+    if stat == "first":
+        return values[starts]
+    if stat == "last":
+        return values[ends - 1]
+    if stat == "span":
+        return values[ends - 1] - values[starts]
+    if stat == "count":
+        return np.add.reduceat(valid, starts)
+    if stat == "min":
+        return np.fmin.reduceat(values, starts)
+    if stat == "max":
+        return np.fmax.reduceat(values, starts)
+    if stat == "absmax":
+        return np.fmax.reduceat(np.abs(values), starts)
+    if stat in ("sum", "mean"):
+        total = np.add.reduceat(np.nan_to_num(values), starts)
+        if stat == "sum":
+            return total
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return total / np.add.reduceat(valid, starts)
+    raise ValueError(f"Unknown statistic {stat!r}, expected one of {STATS}")
+
+
+def corner_phase_table(df, reductions=None, track=None, apex_radius=10):
+    """
+    Tidy lap x corner x phase table of segment metrics, one row per segment with
+    lap_index, corner, phase, n_rows and one column per reduction.
+
+    reductions maps output names to (column, statistic) pairs, statistic being one
+    of STATS. Rows are grouped into segments by a counting sort and every segment
+    is reduced in a single pass over contiguous rows, so the cost is linear in the
+    rows plus the number of lap x corner x phase combinations.
+
+    Example Usage:
+    corner_phase_table(df, {"min_speed": ("M_SPEED_1", "min")})
+    """
+    if reductions is None:
+        reductions = DEFAULT_REDUCTIONS
+
+    track = get_track(track)
+    corners = list(track["corners"])
+    rows, keys, starts, laps = corner_phase_segments(df, track, apex_radius)
+
+    lap, rest = np.divmod(keys, len(corners) * len(PHASES))
+    corner, phase = np.divmod(rest, len(PHASES))
+
+    table = {
+        "lap_index": np.asarray(laps)[lap],
+        "corner": pd.Categorical.from_codes(corner, [c.upper() for c in corners]),
+        "phase": pd.Categorical.from_codes(phase, PHASES, ordered=True),
+        "n_rows": np.diff(np.r_[starts, len(rows)]),
+    }
+
+    for name, (column, stat) in reductions.items():
+        if column == "lateral_g" and column not in df.columns:
+            values = lateral_g(df)[rows]
+        else:
+            values = df[column].to_numpy(dtype=np.float64)[rows]
+        table[name] = segment_reduce(values, starts, stat)
+
+    logger.info(
+        f"Reduced {len(rows)} window rows into {len(starts)} corner-phase segments."
+    )
+    return pd.DataFrame(table)
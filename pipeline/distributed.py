@@ -0,0 +1,435 @@
+import argparse
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+import traceback
+import uuid
+import logging
+import pandas as pd
+from .cleaning import prepare_chunk
+from .column_store import column_store_frame, write_column_store
+from .loading import read_data
+from .tracks import MELBOURNE
+
+logger = logging.getLogger(__name__)
+
+# A claim not refreshed for this long (s) belongs to a crashed worker and may be
+# taken over. Keep it well above the clock skew between nodes.
+LEASE = 600
+
+# Seconds between polls of a worker waiting for shards claimed by others
+POLL = 10
+
+INDEX = "index.json"
+
+
+def shard_dir(root, session):
+    return os.path.join(root, "shards", str(session))
+
+
+def lock_path(root, session):
+    return os.path.join(root, "claims", f"{session}.lock")
+
+
+def result_dir(root, session):
+    return os.path.join(root, "results", str(session))
+
+
+def failure_path(root, session):
+    return os.path.join(root, "results", f"{session}.failed")
+
+
+def write_json(path, data):
+    """Write JSON next to path and rename it into place, so readers never see half a file."""
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def read_index(root):
+    with open(os.path.join(root, INDEX)) as f:
+        return json.load(f)
+
+
+def shard_sessions(
+    root, data_path=None, chunk_size=None, track_id=MELBOURNE, **options
+):
+    """
+    Split the raw telemetry of track_id into one shard per M_SESSIONUID under
+    root/shards, one column store per raw chunk a session appears in, so the
+    raw data is streamed once and never held whole.
+
+    The index written last (root/index.json) lists each session with its number
+    of laps and raw rows, which finalize needs to number laps and rows as one
+    run would, and the pipeline options (see data_pipeline) every worker runs
+    with.
+    """
+    if os.path.exists(os.path.join(root, INDEX)):
+        raise FileExistsError(f"{root} is already sharded; use a new root per job.")
+
+    chunks = read_data(data_path, chunk_size=chunk_size)
+    if not chunk_size:
+        chunks = [chunks]
+
+    laps, rows_read = {}, {}
+    for i, chunk in enumerate(chunks):
+        chunk = prepare_chunk(chunk, track_id)
+        for session, rows in chunk.groupby("M_SESSIONUID", sort=False):
+            session = int(session)
+            write_column_store(
+                rows.reset_index(drop=True),
+                os.path.join(shard_dir(root, session), f"{i:06d}"),
+            )
+            laps.setdefault(session, set()).update(rows["M_CURRENTLAPNUM"].unique())
+            rows_read[session] = rows_read.get(session, 0) + len(rows)
+
+    for sub in ("claims", "results"):
+        os.makedirs(os.path.join(root, sub), exist_ok=True)
+
+    sessions = {
+        str(s): {"laps": len(laps[s]), "rows": rows_read[s]} for s in sorted(laps)
+    }
+    write_json(
+        os.path.join(root, INDEX),
+        {"track": track_id, "options": options, "sessions": sessions},
+    )
+    logger.info(f"Wrote {len(sessions)} session shards of track {track_id} to {root}.")
+    return sessions
+
+
+def load_shard(root, session):
+    """Raw rows of a session shard, its chunk parts concatenated in read order."""
+    path = shard_dir(root, session)
+    parts = [
+        column_store_frame(os.path.join(path, p)) for p in sorted(os.listdir(path))
+    ]
+    return pd.concat(parts, ignore_index=True)
+
+
+def claim_shard(root, session, lease=LEASE):
+    """
+    Try to claim a shard. The lock file is created with O_CREAT | O_EXCL, which
+    only one worker can win. A lock whose lease has expired is renamed away
+    (atomic) and checked again: if the renamed file is not the expired lock that
+    was seen (another worker broke it and claimed the shard in between, or its
+    owner renewed it), it is linked back into place and the claim gives up.
+    Returns the owner token, or None if the shard is claimed by a live worker.
+    """
+    path = lock_path(root, session)
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        stale = f"{path}.{uuid.uuid4().hex}.stale"
+        try:
+            seen = os.stat(path)
+            if time.time() - seen.st_mtime <= lease:
+                return None
+            os.rename(path, stale)
+        except FileNotFoundError:
+            # Released or broken by another worker in the meantime
+            return None
+
+        moved = os.stat(stale)
+        if (moved.st_ino, moved.st_mtime) != (seen.st_ino, seen.st_mtime):
+            # A live lock was taken by mistake: put it back unless the shard has
+            # been claimed again since
+            try:
+                os.link(stale, path)
+            except FileExistsError:
+                pass
+            os.remove(stale)
+            return None
+
+        os.remove(stale)
+        logger.warning(f"Lease of shard {session} expired; reclaiming it.")
+        return claim_shard(root, session, lease)
+
+    with os.fdopen(fd, "w") as f:
+        json.dump({"owner": owner, "claimed": time.time()}, f)
+    return owner
+
+
+def release_shard(root, session, owner):
+    """Remove the shard's lock if it is still held by owner."""
+    path = lock_path(root, session)
+    try:
+        with open(path) as f:
+            held = json.load(f).get("owner")
+    except (FileNotFoundError, ValueError):
+        return
+    if held == owner:
+        os.remove(path)
+
+
+def renew_lease(root, session, stop, lease=LEASE):
+    """Touch the shard's lock every third of the lease until stop is set."""
+    while not stop.wait(lease / 3):
+        try:
+            os.utime(lock_path(root, session))
+        except FileNotFoundError:
+            # Moved aside by a worker checking the lease; it is put back
+            continue
+
+
+def run_shard(root, session, index):
+    """
+    Run every pipeline stage on one shard and publish the telemetry, summary and
+    reports as column stores in root/results/<session>. The telemetry keeps its
+    row labels (which events refer to) in a row column.
+
+    Outputs are written to a temporary directory renamed into place, so a shard
+    processed twice (e.g. by a worker that lost its lease) publishes once.
+    """
+    from .pipeline import data_pipeline
+
+    reports = {}
+    df, _, _, _, summary = data_pipeline(
+        raw=load_shard(root, session),
+        track=index["track"],
+        reports=reports,
+        **index["options"],
+    )
+
+    tmp = os.path.join(root, "results", f".{session}.{uuid.uuid4().hex}")
+    outputs = {
+        "telemetry": df.rename_axis("row").reset_index(),
+        "summary": summary,
+        **reports,
+    }
+    for name, frame in outputs.items():
+        if frame is not None:
+            write_column_store(frame, os.path.join(tmp, name))
+
+    try:
+        os.rename(tmp, result_dir(root, session))
+    except OSError:
+        # Another worker published the shard first
+        shutil.rmtree(tmp)
+
+
+def remove_stale_outputs(root, session=None, lease=LEASE):
+    """
+    Remove the temporary output directories (results/.<session>.<uuid>) of
+    workers that crashed while writing, for one session or all of them. Only
+    directories untouched for longer than the lease are removed, so a worker
+    still writing keeps its own.
+    """
+    results = os.path.join(root, "results")
+    prefix = "." if session is None else f".{session}."
+    for name in os.listdir(results):
+        path = os.path.join(results, name)
+        if not name.startswith(prefix) or not os.path.isdir(path):
+            continue
+        try:
+            if time.time() - os.stat(path).st_mtime > lease:
+                shutil.rmtree(path)
+                logger.warning(f"Removed partial shard output {name}.")
+        except FileNotFoundError:
+            pass
+
+
+def shard_status(root, index=None):
+    """Sessions of the job split into done, failed and pending."""
+    index = index or read_index(root)
+    status = {"done": [], "failed": [], "pending": []}
+    for session in index["sessions"]:
+        if os.path.exists(result_dir(root, session)):
+            status["done"].append(session)
+        elif os.path.exists(failure_path(root, session)):
+            status["failed"].append(session)
+        else:
+            status["pending"].append(session)
+    return status
+
+
+def run_worker(root, lease=LEASE, poll=POLL, wait=True):
+    """
+    Claim and run pending shards until none are left. While other workers hold
+    the remaining shards the worker waits (with wait) so it can take over any
+    whose lease expires after a crash. A shard that raises is marked failed
+    with its traceback and not retried. Returns the sessions it ran.
+    """
+    index = read_index(root)
+    ran = []
+
+    while True:
+        pending = shard_status(root, index)["pending"]
+        if not pending:
+            return ran
+
+        claimed = False
+        for session in pending:
+            owner = claim_shard(root, session, lease)
+            if owner is None:
+                continue
+            claimed = True
+
+            # Finished by another worker between the status check and the claim
+            if os.path.exists(result_dir(root, session)):
+                release_shard(root, session, owner)
+                continue
+
+            # Partial outputs of a worker that crashed on this shard before
+            remove_stale_outputs(root, session, lease)
+
+            stop = threading.Event()
+            heartbeat = threading.Thread(
+                target=renew_lease, args=(root, session, stop, lease), daemon=True
+            )
+            heartbeat.start()
+            try:
+                logger.info(f"Running shard {session}.")
+                run_shard(root, session, index)
+                ran.append(session)
+            except Exception:
+                logger.exception(f"Shard {session} failed.")
+                with open(failure_path(root, session), "w") as f:
+                    f.write(traceback.format_exc())
+            finally:
+                stop.set()
+                heartbeat.join()
+                release_shard(root, session, owner)
+
+        if not claimed:
+            if not wait:
+                return ran
+            time.sleep(poll)
+
+
+def finalize(root):
+    """
+    Merge the shard outputs into (df, summary, reports) as one data_pipeline run
+    over all sessions would produce them.
+
+    lap_index is renumbered in (M_SESSIONUID, M_CURRENTLAPNUM) order across
+    sessions, offsetting each shard by the laps of the sessions before it, so
+    laps keep the index re_index gives them in a single run. Telemetry row
+    labels (and the event rows pointing at them) are offset the same way by the
+    raw rows of the sessions before. Row labels therefore only match a single
+    run when the raw CSV holds each session's rows contiguously and sessions in
+    M_SESSIONUID order; lap_index does not depend on the row order. Statistics
+    cubes are merged and the rollups rebuilt from the merged summary. Partial
+    outputs left by crashed workers are removed.
+    """
+    from .rollups import lap_rollups, rollup_report
+    from .stats_cube import merge_cubes
+
+    index = read_index(root)
+    status = shard_status(root, index)
+    if status["failed"] or status["pending"]:
+        raise RuntimeError(
+            f"Cannot finalize {root}: failed shards {status['failed']}, "
+            f"pending shards {status['pending']}."
+        )
+    remove_stale_outputs(root)
+
+    parts = {}
+    lap_offset = row_offset = 0
+    for session, shard in index["sessions"].items():
+        path = result_dir(root, session)
+        for name in sorted(os.listdir(path)):
+            frame = column_store_frame(os.path.join(path, name))
+            if "lap_index" in frame.columns:
+                frame = frame.assign(lap_index=frame["lap_index"] + lap_offset)
+            if "row" in frame.columns:
+                frame = frame.assign(row=frame["row"] + row_offset)
+            parts.setdefault(name, []).append(frame)
+        lap_offset += shard["laps"]
+        row_offset += shard["rows"]
+
+    merged = {
+        name: pd.concat(frames, ignore_index=True)
+        for name, frames in parts.items()
+        if not name.endswith("_rollup")
+    }
+    df = merged.pop("telemetry").set_index("row").rename_axis(None)
+    summary = merged.pop("summary", None)
+
+    if "stats_cube" in merged:
+        merged["stats_cube"] = merge_cubes(merged["stats_cube"])
+    if summary is not None and any(name.endswith("_rollup") for name in parts):
+        rollups = lap_rollups(summary, merged.get("corner_phases"))
+        for level, partials in rollups.items():
+            merged[f"{level}_rollup"] = rollup_report(partials)
+
+    logger.info(
+        f"Merged {len(index['sessions'])} shards: {len(df)} rows, {lap_offset} laps."
+    )
+    return df, summary, merged
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run the pipeline over session shards on a shared filesystem: "
+        "shard once, start workers on any nodes, then finalize."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    shard = commands.add_parser("shard", help="Split the raw data into session shards")
+    shard.add_argument("--root", required=True, help="Shared job directory")
+    shard.add_argument("--data", help="Raw telemetry CSV")
+    shard.add_argument("--chunk-size", type=int, help="Read the raw CSV in chunks")
+    shard.add_argument("--track", type=int, default=MELBOURNE, help="M_TRACKID")
+    shard.add_argument("--slicer", choices=["polygon", "gates"], default="polygon")
+    shard.add_argument("--backend", choices=["auto", "numpy", "numba"], default="auto")
+    shard.add_argument("--plan", action="store_true")
+
+    worker = commands.add_parser("worker", help="Claim and run shards")
+    worker.add_argument("--root", required=True, help="Shared job directory")
+    worker.add_argument(
+        "--lease", type=float, default=LEASE, help=f"Lease in seconds (default {LEASE})"
+    )
+    worker.add_argument(
+        "--no-wait",
+        action="store_true",
+        help="Exit once no shard can be claimed instead of waiting for claimed ones",
+    )
+
+    final = commands.add_parser("finalize", help="Merge the shard outputs")
+    final.add_argument("--root", required=True, help="Shared job directory")
+    final.add_argument("--output-dir", default="output")
+    final.add_argument("--format", choices=["csv", "npy", "both"], default="both")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+
+    if args.command == "shard":
+        shard_sessions(
+            args.root,
+            args.data,
+            chunk_size=args.chunk_size,
+            track_id=args.track,
+            slicer=args.slicer,
+            backend=args.backend,
+            plan=args.plan,
+        )
+    elif args.command == "worker":
+        ran = run_worker(args.root, lease=args.lease, wait=not args.no_wait)
+        print(f"Ran {len(ran)} shards.")
+    else:
+        from .cli import write_outputs
+        from .loading import read_process_left, read_process_right, read_process_line
+
+        df, summary, reports = finalize(args.root)
+        track = read_index(args.root)["track"]
+        outputs = {
+            "telemetry": df,
+            "summary": summary,
+            "left": read_process_left(track=track),
+            "right": read_process_right(track=track),
+            "line": read_process_line(track=track),
+            **reports,
+        }
+        write_outputs(outputs, args.output_dir, args.format)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+import logging
+from .targets import lap_segments
+from .tracks import get_track
+
+logger = logging.getLogger(__name__)
+
+# An event starts when the channel rises above "on" and lasts until it falls to
+# "off" or below (off <= on gives the hysteresis band). "below" detects dips
+# under the thresholds instead, "abs" uses the magnitude of the channel. Events
+# shorter than min_duration_ms are dropped.
+EVENT_RULES = {
+    "brake": {"channel": "M_BRAKE_1", "on": 0.2, "off": 0.05, "min_duration_ms": 100},
+    "throttle_lift": {
+        "channel": "M_THROTTLE_1",
+        "on": 0.5,
+        "off": 0.8,
+        "below": True,
+        "min_duration_ms": 100,
+    },
+    "steering": {
+        "channel": "M_STEER_1",
+        "on": 0.2,
+        "off": 0.1,
+        "abs": True,
+        "min_duration_ms": 100,
+    },
+    "drs": {"channel": "M_DRS_1", "on": 0.5, "off": 0.5, "min_duration_ms": 0},
+}
+
+EVENT_COLUMNS = [
+    "lap_index",
+    "event",
+    "corner",
+    "start_ms",
+    "end_ms",
+    "duration_ms",
+    "x",
+    "y",
+    "lap_distance",
+    "peak",
+    "n_rows",
+    "row",
+]
+
+
+def hysteresis_state(values, on, off, lap_first):
+    """
+    Boolean on/off state of every row (in lap/time order). Rows above on switch
+    the state on, rows at or below off switch it off, rows in between (or NaN)
+    keep the previous row's state. Every lap starts off.
+    """
+    determined = (values > on) | (values <= off) | lap_first
+    state = values > on
+
+    # Carry the last determined row forward; lap starts are always determined,
+    # so nothing carries across laps
+    last = np.maximum.accumulate(np.where(determined, np.arange(len(values)), 0))
+    return state[last]
+
+
+def state_runs(state, lap_first):
+    """First and last row of every run of on rows, never spanning two laps."""
+    lap_last = np.r_[lap_first[1:], True]
+    prev_on = np.r_[False, state[:-1]] & ~lap_first
+    next_on = np.r_[state[1:], False] & ~lap_last
+    return np.flatnonzero(state & ~prev_on), np.flatnonzero(state & ~next_on)
+
+
+def run_peak(values, starts, ends):
+    """Maximum of values over each run starts[i]..ends[i], ignoring NaN."""
+    if not len(starts):
+        return np.empty(0)
+    # reduceat over [start, end + 1) pairs; the odd slots cover the gaps between runs
+    bounds = np.c_[starts, ends + 1].ravel()
+    padded = np.r_[values, np.nan]
+    return np.fmax.reduceat(padded, bounds)[::2]
+
+
+def nearest_corner(x, y, track=None):
+    """Name of the corner whose turning window contains each point, None elsewhere."""
+    track = get_track(track)
+    names = [name.upper() for name in track["corners"]]
+    dist = np.stack([np.hypot(x - ax, y - ay) for ax, ay in track["corners"].values()])
+    nearest = np.argmin(dist, axis=0)
+    inside = dist[nearest, np.arange(len(x))] <= track["turn_radius"]
+    return np.where(inside, np.array(names, dtype=object)[nearest], None)
+
+
+def detect_events(
+    df, rules=None, time_col="M_CURRENTLAPTIMEINMS_1", track=None, positions=False
+):
+    """
+    Finds every event of every rule in all laps at once and returns the event
+    table, one row per event with its lap, type, the corner it starts in, start
+    and end time, start position and lap distance, peak value, row count and the
+    index label of its first row. With positions=True the table also has the
+    position of the first row in df (for iloc or to_numpy lookups, which stay
+    correct when index labels repeat).
+
+    Rows are put in lap/time order once; each rule is then a single linear pass:
+    hysteresis state by forward-filling the last decisive row, edges from the
+    state changes inside each lap, and peaks from a segmented reduction.
+
+    Example Usage:
+    events = detect_events(df)
+    events[(events["event"] == "brake") & (events["corner"] == "T1")]
+    """
+    if rules is None:
+        rules = {k: r for k, r in EVENT_RULES.items() if r["channel"] in df.columns}
+
+    laps, codes, order, starts = lap_segments(df, "lap_index", time_col)
+    lap_first = np.zeros(len(order), dtype=bool)
+    lap_first[starts] = True
+    lap = np.asarray(laps)[codes[order]]
+    times = df[time_col].to_numpy(dtype=np.float64)[order]
+
+    tables = []
+    for event, rule in rules.items():
+        # "below" rules are detected as rising edges of the negated channel
+        sign = -1.0 if rule.get("below") else 1.0
+        on, off = sign * rule["on"], sign * rule["off"]
+        if off > on:
+            raise ValueError(f"Rule {event!r}: off threshold is past the on threshold")
+
+        raw = df[rule["channel"]].to_numpy(dtype=np.float64)[order]
+        values = np.abs(raw) if rule.get("abs") else raw
+
+        state = hysteresis_state(sign * values, on, off, lap_first)
+        run_start, run_end = state_runs(state, lap_first)
+
+        duration = times[run_end] - times[run_start]
+        keep = duration >= rule.get("min_duration_ms", 0)
+        run_start, run_end, duration = run_start[keep], run_end[keep], duration[keep]
+
+        tables.append(
+            pd.DataFrame(
+                {
+                    "lap_index": lap[run_start],
+                    "event": event,
+                    "start_ms": times[run_start],
+                    "end_ms": times[run_end],
+                    "duration_ms": duration,
+                    "peak": sign * run_peak(sign * values, run_start, run_end),
+                    "n_rows": run_end - run_start + 1,
+                    "row": df.index.to_numpy()[order[run_start]],
+                    "position": order[run_start],
+                }
+            )
+        )
+
+    columns = EVENT_COLUMNS + (["position"] if positions else [])
+    events = pd.concat(tables, ignore_index=True) if tables else pd.DataFrame()
+    if events.empty:
+        return pd.DataFrame(columns=columns)
+
+    pos = events["position"].to_numpy()
+    x = df["M_WORLDPOSITIONX_1"].to_numpy(dtype=np.float64)[pos]
+    y = df["M_WORLDPOSITIONY_1"].to_numpy(dtype=np.float64)[pos]
+    events["x"], events["y"] = x, y
+    events["lap_distance"] = df["M_LAPDISTANCE_1"].to_numpy()[pos]
+    events["corner"] = nearest_corner(x, y, track)
+
+    events = events.sort_values(["lap_index", "start_ms"], kind="stable")
+    logger.info(f"Detected {len(events)} events over {len(laps)} laps.")
+    return events[columns].reset_index(drop=True)
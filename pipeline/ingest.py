@@ -0,0 +1,123 @@
+import queue
+import threading
+import pandas as pd
+import logging
+from .loading import read_data
+
+logger = logging.getLogger(__name__)
+
+
+def pipelined_map(chunks, transform, workers=1, depth=2):
+    """
+    Yields transform(chunk) for every chunk, in order, while the next chunks are
+    still being produced.
+
+    A reader thread pulls chunks from the iterator (for a chunked read_csv this
+    is where the parsing happens) into a queue of at most depth chunks, and
+    workers threads transform them as they arrive. Results are handed back in
+    input order. At most depth + workers chunks are held at any time, read,
+    queued, in flight or waiting to be consumed, so memory is bounded by the
+    queue depth rather than the file size.
+
+    Exceptions raised while reading or transforming are re-raised here.
+    """
+    workers = max(workers or 1, 1)
+    tasks = queue.Queue(maxsize=depth)
+    slots = threading.Semaphore(depth + workers)
+    stop = threading.Event()
+    done = threading.Condition()
+    results = {}
+    state = {"count": None, "error": None}
+
+    def fail(error):
+        stop.set()
+        with done:
+            if state["error"] is None:
+                state["error"] = error
+            done.notify_all()
+
+    def read():
+        count = 0
+        try:
+            iterator = iter(chunks)
+            while True:
+                # Wait for a free slot before parsing the next chunk
+                slots.acquire()
+                if stop.is_set():
+                    break
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    break
+                tasks.put((count, chunk))
+                count += 1
+        except BaseException as error:
+            fail(error)
+        finally:
+            with done:
+                state["count"] = count
+                done.notify_all()
+            for _ in range(workers):
+                tasks.put(None)
+
+    def work():
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            i, chunk = task
+            if stop.is_set():
+                continue
+            try:
+                out = transform(chunk)
+            except BaseException as error:
+                fail(error)
+                continue
+            with done:
+                results[i] = out
+                done.notify_all()
+
+    threads = [threading.Thread(target=read, daemon=True)]
+    threads += [threading.Thread(target=work, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    try:
+        i = 0
+        while True:
+            with done:
+                done.wait_for(
+                    lambda: i in results
+                    or state["error"] is not None
+                    or (state["count"] is not None and i >= state["count"])
+                )
+                if state["error"] is not None:
+                    raise state["error"]
+                if i not in results:
+                    break
+                out = results.pop(i)
+            slots.release()
+            yield out
+            i += 1
+    finally:
+        # Unblock the reader if the consumer stopped early, then wind down
+        stop.set()
+        for _ in range(depth + workers):
+            slots.release()
+        for thread in threads:
+            thread.join()
+
+
+def read_chunks(path=None, chunk_size=100_000, transform=None, workers=1, depth=2):
+    """
+    Read the raw CSV in chunks, parsing the next chunk while earlier ones go
+    through transform, and concatenate the transformed chunks in file order.
+    """
+    chunks = read_data(path, chunk_size=chunk_size)
+    if transform is None:
+        parts = list(chunks)
+    else:
+        parts = list(pipelined_map(chunks, transform, workers=workers, depth=depth))
+
+    logger.info(f"Read {len(parts)} chunks of up to {chunk_size} rows.")
+    return pd.concat(parts, ignore_index=True)
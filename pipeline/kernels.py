@@ -0,0 +1,182 @@
+import numpy as np
+from .tracks import get_track
+
+# Numba is optional: without it telemetry_eng uses the NumPy implementations.
+try:
+    from numba import njit, prange
+
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+GEOMETRY_INPUTS = [
+    "M_WORLDPOSITIONX_1",
+    "M_WORLDPOSITIONY_1",
+    "M_WORLDFORWARDDIRX_1",
+    "M_WORLDFORWARDDIRY_1",
+    "M_FRONTWHEELSANGLE",
+    "VEL_X",
+    "VEL_Y",
+    "M_BRAKESTEMPERATURE_FL_1",
+    "M_BRAKESTEMPERATURE_FR_1",
+    "M_BRAKESTEMPERATURE_RL_1",
+    "M_BRAKESTEMPERATURE_RR_1",
+]
+
+GEOMETRY_OUTPUTS = [
+    "dist_to_t1_apex",
+    "dist_to_t2_apex",
+    "is_t1_window",
+    "is_t2_window",
+    "angle_fw_vs_vel",
+    "angle_car_vs_vel",
+    "angle_fw_vs_car",
+    "brake_front_rear_diff",
+    "brake_left_right_diff",
+]
+
+
+if NUMBA_AVAILABLE:
+
+    @njit(parallel=True, error_model="numpy", cache=True)
+    def geometry_kernel(
+        x,
+        y,
+        fwd_x,
+        fwd_y,
+        wheel_deg,
+        vel_x,
+        vel_y,
+        fl,
+        fr,
+        rl,
+        rr,
+        t1x,
+        t1y,
+        t2x,
+        t2y,
+        radius,
+        dist_t1,
+        dist_t2,
+        is_t1,
+        is_t2,
+        fw_vs_vel,
+        car_vs_vel,
+        fw_vs_car,
+        front_rear,
+        left_right,
+    ):
+        for i in prange(x.shape[0]):
+            # Turning windows
+            d1 = np.sqrt((x[i] - t1x) ** 2 + (y[i] - t1y) ** 2)
+            d2 = np.sqrt((x[i] - t2x) ** 2 + (y[i] - t2y) ** 2)
+            dist_t1[i] = d1
+            dist_t2[i] = d2
+            is_t1[i] = d1 <= radius
+            is_t2[i] = d2 <= radius
+
+            # Front wheel direction: car forward vector rotated by the wheel angle
+            theta = np.deg2rad(wheel_deg[i])
+            c = np.cos(theta)
+            s = np.sin(theta)
+            fw_x = fwd_x[i] * c - fwd_y[i] * s
+            fw_y = fwd_x[i] * s + fwd_y[i] * c
+
+            norm_fw = np.sqrt(fw_x * fw_x + fw_y * fw_y)
+            norm_fwd = np.sqrt(fwd_x[i] * fwd_x[i] + fwd_y[i] * fwd_y[i])
+            norm_vel = np.sqrt(vel_x[i] * vel_x[i] + vel_y[i] * vel_y[i])
+
+            # Front wheel vs velocity
+            if norm_fw > 0 and norm_vel > 0:
+                cos_t = (fw_x * vel_x[i] + fw_y * vel_y[i]) / (norm_fw * norm_vel)
+                cos_t = min(max(cos_t, -1.0), 1.0)
+                fw_vs_vel[i] = 180 - np.rad2deg(np.arccos(cos_t))
+            else:
+                fw_vs_vel[i] = np.nan
+
+            # Car direction vs velocity
+            if norm_fwd > 0 and norm_vel > 0:
+                cos_t = (fwd_x[i] * vel_x[i] + fwd_y[i] * vel_y[i]) / (
+                    norm_fwd * norm_vel
+                )
+                cos_t = min(max(cos_t, -1.0), 1.0)
+                car_vs_vel[i] = 180 - np.rad2deg(np.arccos(cos_t))
+            else:
+                car_vs_vel[i] = np.nan
+
+            # Front wheel vs car direction, folded into 0-90
+            cos_t = (fw_x * fwd_x[i] + fw_y * fwd_y[i]) / (norm_fw * norm_fwd)
+            if cos_t > 1.0:
+                cos_t = 1.0
+            elif cos_t < -1.0:
+                cos_t = -1.0
+            angle = np.rad2deg(np.arccos(cos_t))
+            fw_vs_car[i] = 180 - angle if angle > 90 else angle
+
+            # Brake temperature balance
+            front_rear[i] = (fl[i] + fr[i]) / 2 - (rl[i] + rr[i]) / 2
+            left_right[i] = (fl[i] + rl[i]) / 2 - (fr[i] + rr[i]) / 2
+
+
+def geometry_features_numba(df, track=None):
+    """
+    Computes the turning window, steering/slip angle and brake balance columns in a
+    single multithreaded pass, writing into preallocated output arrays.
+    """
+    track = get_track(track)
+    (t1x, t1y), (t2x, t2y) = track["corners"]["t1"], track["corners"]["t2"]
+
+    inputs = [
+        np.ascontiguousarray(df[col].to_numpy(dtype=np.float64))
+        for col in GEOMETRY_INPUTS
+    ]
+
+    n = len(df)
+    outputs = {
+        col: np.empty(n, dtype=bool if col.startswith("is_") else np.float64)
+        for col in GEOMETRY_OUTPUTS
+    }
+
+    geometry_kernel(
+        *inputs,
+        float(t1x),
+        float(t1y),
+        float(t2x),
+        float(t2y),
+        float(track["turn_radius"]),
+        *outputs.values(),
+    )
+
+    return df.assign(**outputs)
+
+
+if NUMBA_AVAILABLE:
+
+    @njit(cache=True)
+    def window_min_kernel(values, begin, out):
+        # Monotonic deque of row positions with increasing values; rows leave the
+        # front once they fall before the window start. NaN rows are skipped.
+        deque = np.empty(values.shape[0], dtype=np.int64)
+        head = 0
+        tail = 0
+        for i in range(values.shape[0]):
+            v = values[i]
+            if not np.isnan(v):
+                while tail > head and values[deque[tail - 1]] >= v:
+                    tail -= 1
+                deque[tail] = i
+                tail += 1
+            while tail > head and deque[head] < begin[i]:
+                head += 1
+            out[i] = values[deque[head]] if tail > head else np.nan
+
+
+def window_min_numba(values, begin):
+    """Rolling minimum over the rows begin[i]..i with the monotonic-deque kernel."""
+    out = np.empty(len(values))
+    window_min_kernel(
+        np.ascontiguousarray(values, dtype=np.float64),
+        np.ascontiguousarray(begin, dtype=np.int64),
+        out,
+    )
+    return out
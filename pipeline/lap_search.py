@@ -0,0 +1,160 @@
+import numpy as np
+import pandas as pd
+import logging
+from .resampling import resample_laps, delta_time
+
+logger = logging.getLogger(__name__)
+
+SEARCH_CHANNELS = ["M_SPEED_1", "M_BRAKE_1", "M_THROTTLE_1"]
+
+
+def build_lap_index(
+    df,
+    channels=None,
+    distance_col="M_LAPDISTANCE_1",
+    step=1.0,
+    start=None,
+    stop=None,
+    method="exact",
+    n_components=16,
+):
+    """
+    Builds a lap-similarity index from distance-aligned speed/brake/throttle traces.
+
+    Each lap becomes one feature vector: its channels resampled onto a common
+    distance grid, z-scored per channel and flattened. Stations a lap does not
+    cover are filled with the channel mean (0 after scaling).
+
+    method="exact" answers queries with a batched matrix search over all laps.
+    method="kdtree" projects the vectors onto their first n_components principal
+    components and queries a cKDTree (approximate, but sub-linear).
+    """
+    if channels is None:
+        channels = SEARCH_CHANNELS
+
+    laps, stations, cube = resample_laps(
+        df,
+        ["M_CURRENTLAPTIMEINMS_1"] + list(channels),
+        distance_col=distance_col,
+        step=step,
+        start=start,
+        stop=stop,
+    )
+    times = cube[:, :, 0]
+    traces = cube[:, :, 1:]
+
+    # Scale each channel so speed (km/h) does not swamp brake/throttle (0-1)
+    mean = np.nanmean(traces, axis=(0, 1))
+    std = np.nanstd(traces, axis=(0, 1))
+    std[std == 0] = 1
+    scaled = np.nan_to_num((traces - mean) / std, nan=0.0)
+
+    features = scaled.reshape(len(laps), -1).astype(np.float32)
+
+    index = {
+        "lap_index": laps,
+        "stations": stations,
+        "channels": list(channels),
+        "times": times,
+        "features": features,
+        "sq_norms": np.einsum("ij,ij->i", features, features),
+        "method": method,
+    }
+
+    if method == "kdtree":
+        from scipy.spatial import cKDTree
+
+        centre = features.mean(axis=0)
+        _, _, vt = np.linalg.svd(features - centre, full_matrices=False)
+        components = vt[:n_components]
+        index["centre"] = centre
+        index["components"] = components
+        index["tree"] = cKDTree((features - centre) @ components.T)
+    elif method != "exact":
+        raise ValueError(f"Unknown lap index method: {method}")
+
+    logger.info(f"Built {method} lap index over {len(laps)} laps.")
+    return index
+
+
+def lap_rows(index, lap_ids):
+    """Map lap_index values to row positions in the index."""
+    lap_ids = np.atleast_1d(lap_ids)
+    rows = np.searchsorted(index["lap_index"], lap_ids)
+    rows = np.clip(rows, 0, len(index["lap_index"]) - 1)
+    missing = index["lap_index"][rows] != lap_ids
+    if missing.any():
+        raise KeyError(f"Laps not in index: {lap_ids[missing].tolist()}")
+    return rows
+
+
+def query_similar_laps(index, lap_ids, k=5, batch_size=1024):
+    """
+    Returns the k most similar laps to each query lap (excluding itself) as a
+    dataframe with lap_index, neighbour, rank and distance columns.
+
+    Example Usage:
+    index = build_lap_index(df)
+    query_similar_laps(index, [12, 40], k=10)
+    """
+    rows = lap_rows(index, lap_ids)
+    features = index["features"]
+    n_laps = len(features)
+    k = min(k, n_laps - 1)
+
+    results = []
+    for b in range(0, len(rows), batch_size):
+        batch = rows[b : b + batch_size]
+
+        if index["method"] == "kdtree":
+            projected = (features[batch] - index["centre"]) @ index["components"].T
+            dist, nbr = index["tree"].query(projected, k=k + 1)
+            dist, nbr = np.atleast_2d(dist), np.atleast_2d(nbr)
+        else:
+            # ||q - x||^2 = ||q||^2 + ||x||^2 - 2 q.x for the whole batch at once
+            sq = (
+                index["sq_norms"][batch][:, None]
+                + index["sq_norms"][None, :]
+                - 2 * features[batch] @ features.T
+            )
+            np.maximum(sq, 0, out=sq)
+            nbr = np.argpartition(sq, k, axis=1)[:, : k + 1]
+            part = np.take_along_axis(sq, nbr, axis=1)
+            order = np.argsort(part, axis=1)
+            nbr = np.take_along_axis(nbr, order, axis=1)
+            dist = np.sqrt(np.take_along_axis(part, order, axis=1))
+
+        # Drop each query lap from its own neighbours and keep the first k left
+        keep = nbr != batch[:, None]
+        rank = np.cumsum(keep, axis=1)
+        keep &= rank <= k
+        results.append(
+            pd.DataFrame(
+                {
+                    "lap_index": np.repeat(index["lap_index"][batch], keep.sum(axis=1)),
+                    "neighbour": index["lap_index"][nbr[keep]],
+                    "rank": rank[keep],
+                    "distance": dist[keep],
+                }
+            )
+        )
+
+    return pd.concat(results, ignore_index=True)
+
+
+def lap_delta_times(index, reference_lap=None):
+    """
+    Delta-time curves (s) of every lap against a reference lap, one row per
+    lap_index and one column per distance station. Defaults to the fastest lap
+    over the indexed distance range.
+    """
+    reference = None
+    if reference_lap is not None:
+        reference = lap_rows(index, reference_lap)[0]
+
+    delta = delta_time(index["times"], reference)
+    return pd.DataFrame(
+        delta,
+        index=pd.Index(index["lap_index"], name="lap_index"),
+        columns=index["stations"],
+    )
@@ -1,64 +1,53 @@
 import pandas as pd
+from .tracks import get_track
 
 
-def read_data(path=None):
-    """Load the UNSW F1 2024 dataset, defaulting to repo structure if no path is given."""
-    if path:
-        return pd.read_csv(f"{path}")
-    else:
-        return pd.read_csv("data/UNSW F12024.csv")
+def read_data(path=None, chunk_size=None):
+    """
+    Load the UNSW F1 2024 dataset, defaulting to repo structure if no path is given.
+    With chunk_size, returns an iterator of dataframes of at most chunk_size rows.
+    """
+    if not path:
+        path = "data/UNSW F12024.csv"
+    return pd.read_csv(f"{path}", chunksize=chunk_size)
 
 
-def read_process_left(path=None):
+def read_process_left(path=None, track=None):
     """Load and restrict the left track limits to expected coordinate bounds."""
-    if path:
-        left = pd.read_csv(f"{path}")
-    else:
-        left = pd.read_csv("data/f1sim-ref-left.csv")
+    track = get_track(track)
+    left = pd.read_csv(f"{path or track['left']}")
 
     # Restrict to the same bounds as track_slice
-    left = left[
-        (left["WORLDPOSX"] >= 120)
-        & (left["WORLDPOSX"] <= 600)
-        & (left["WORLDPOSY"] >= -200)
-        & (left["WORLDPOSY"] <= 600)
-    ]
-
-    return left
+    return restrict_bounds(left, track["reference_bounds"])
 
 
-def read_process_right(path=None):
+def read_process_right(path=None, track=None):
     """Load and restrict the right track limits to expected coordinate bounds."""
-    if path:
-        right = pd.read_csv(f"{path}")
-    else:
-        right = pd.read_csv("data/f1sim-ref-right.csv")
+    track = get_track(track)
+    right = pd.read_csv(f"{path or track['right']}")
 
     # Restrict to the same bounds as track_slice
-    right = right[
-        (right["WORLDPOSX"] >= 120)
-        & (right["WORLDPOSX"] <= 600)
-        & (right["WORLDPOSY"] >= -200)
-        & (right["WORLDPOSY"] <= 600)
-    ]
-
-    return right
+    return restrict_bounds(right, track["reference_bounds"])
 
 
-def read_process_line(path=None):
+def read_process_line(path=None, track=None):
     """Load and restrict the right track limits to expected coordinate bounds."""
-    if path:
-        line = pd.read_csv(f"{path}")
-    else:
-        line = pd.read_csv("data/f1sim-ref-line.csv")
+    track = get_track(track)
+    line = pd.read_csv(f"{path or track['line']}")
 
     # Restrict to the same bounds as track_slice
-    line = line[
-        (line["WORLDPOSX"] >= 120)
-        & (line["WORLDPOSX"] <= 600)
-        & (line["WORLDPOSY"] >= -200)
-        & (line["WORLDPOSY"] <= 600)
-    ]
+    line = restrict_bounds(line, track["reference_bounds"])
 
     line = line.sort_values("FRAME")
     return line
+
+
+def restrict_bounds(ref, bounds):
+    """Keep the reference points inside the (xmin, xmax, ymin, ymax) box."""
+    xmin, xmax, ymin, ymax = bounds
+    return ref[
+        (ref["WORLDPOSX"] >= xmin)
+        & (ref["WORLDPOSX"] <= xmax)
+        & (ref["WORLDPOSY"] >= ymin)
+        & (ref["WORLDPOSY"] <= ymax)
+    ]
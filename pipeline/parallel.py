@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+
+def map_chunks(func, df, workers=1, **kwargs):
+    """
+    Apply a row-wise func to contiguous row chunks of df in worker processes and
+    concatenate the results in their original order. func must be a module-level
+    function returning a dataframe or series for its chunk.
+
+    Falls back to a single in-process call when workers <= 1.
+    """
+    if workers is None or workers <= 1 or len(df) < 2 * workers:
+        return func(df, **kwargs)
+
+    bounds = np.linspace(0, len(df), workers + 1).astype(int)
+    chunks = [df.iloc[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(partial(func, **kwargs), chunks))
+
+    return pd.concat(results)
@@ -1,17 +1,47 @@
-import pandas as pd
+import contextlib
+import os
+import shutil
+import time
 import logging
-from .cleaning import cleaning
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from .cleaning import cleaning, read_tracks
 from .spatial import spatial
 from .telemetry_eng import telemetry_eng
 from .summary_eng import summary_eng
+from .targets import targets
+from .corner_phases import corner_phase_table
+from .events import detect_events
+from .stats_cube import build_stats_cube
+from .rollups import lap_rollups, rollup_report
+from .loading import read_process_left, read_process_right, read_process_line
+from .column_store import write_column_store, column_store_frame
+from .planner import reject_laps
+from .tracks import MELBOURNE, TRACKS, get_track
 
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
-)
 logger = logging.getLogger(__name__)
 
+STAGES = ["cleaning", "spatial", "telemetry", "summary", "targets"]
+
 
-def data_pipeline():
+def data_pipeline(
+    data_path=None,
+    left_path=None,
+    right_path=None,
+    line_path=None,
+    stages=None,
+    workers=1,
+    chunk_size=None,
+    cache_dir=None,
+    timings=None,
+    backend="auto",
+    slicer="polygon",
+    plan=False,
+    reports=None,
+    track=None,
+    raw=None,
+):
     """
     Complete data pipeline:
         - load data
@@ -20,19 +50,233 @@ def data_pipeline():
         - re-index the data
         - enforce track limits
         - remove laps with insufficient data
+        - engineer telemetry features and the lap summary
+        - broadcast lap and corner targets (exit/min speed, sector duration)
+
+    stages selects a consecutive run of STAGES to execute. When it does not start
+    with cleaning, the input is loaded from the previous stage's output in
+    cache_dir. With cache_dir set, every stage's output is saved there as a
+    column store so later runs can resume from it.
+
+    Per-stage wall times (s) are recorded in timings when a dict is passed in.
+    backend picks the numba or numpy implementation of the per-row geometry
+    features ("auto" uses numba when installed). slicer="gates" cuts each lap at
+    its start/finish cut line crossings instead of the sector polygon.
+
+    With plan=True every lap-level rejection (stutter, off-track, point counts) is
+    evaluated up front in cleaning and rejected laps are dropped before the
+    spatial and feature stages. The per-lap rejection report is stored in
+    reports["rejections"] when a dict is passed in, and the summary stage adds
+    the lap x corner x phase metrics as reports["corner_phases"] and the brake,
+    throttle, steering and DRS event table as reports["events"] and the per-metre
+    statistics cube (see stats_cube) as reports["stats_cube"], and session, stint
+    and corner rollups of the lap summary as reports["<level>_rollup"].
+
+    track selects the circuit from the track registry (default Albert Park): its
+    M_TRACKID, reference files, sector and corners. raw takes that track's rows
+    already read from the raw data (see multi_track_pipeline).
     """
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+
+    stages = check_stages(stages)
+    track_id = MELBOURNE if track is None else track
+    track = get_track(track)
+    if timings is None:
+        timings = {}
+
+    df = left = right = line = summary = None
+
+    first = STAGES.index(stages[0])
+    if first > 0:
+        df = load_stage_cache(cache_dir, STAGES[first - 1])
+        logger.info(f"Loaded {STAGES[first - 1]} output from cache.")
+
+    with copy_on_write():
+        for stage in stages:
+            start = time.perf_counter()
 
-    df = cleaning()
-    logger.info("Cleaning Complete.")
+            if stage == "cleaning":
+                lap_filter = None
+                if plan:
+                    left = read_process_left(left_path, track)
+                    right = read_process_right(right_path, track)
+                    lap_filter = partial(
+                        reject_laps,
+                        left=left,
+                        right=right,
+                        reports=reports,
+                        track=track,
+                    )
+                df = cleaning(
+                    data_path,
+                    chunk_size=chunk_size,
+                    lap_filter=lap_filter,
+                    track_id=track_id,
+                    raw=raw,
+                    workers=workers,
+                )
+                logger.info("Cleaning Complete.")
 
-    df, left, right = spatial(df)
-    logger.info("Spatial engineering compelete.")
+            elif stage == "spatial":
+                # The planner's off-track check matches the polygon sector, so
+                # gate slicing still enforces the limits on its own rows
+                df, left, right = spatial(
+                    df,
+                    left_path,
+                    right_path,
+                    workers=workers,
+                    slicer=slicer,
+                    enforce_limits=not (plan and slicer == "polygon"),
+                    track=track,
+                    raster_dir=cache_dir and os.path.join(cache_dir, "rasters"),
+                )
+                logger.info("Spatial engineering compelete.")
 
-    df, line = telemetry_eng(df)
-    logger.info("Telemetry engineering complete.")
+            elif stage == "telemetry":
+                df, line = telemetry_eng(df, line_path, backend=backend, track=track)
+                logger.info("Telemetry engineering complete.")
 
-    df, summary = summary_eng(df)
-    logger.info("Summary Engineering complete.")
+            elif stage == "summary":
+                df, summary = summary_eng(df, track)
+                if reports is not None:
+                    reports["corner_phases"] = corner_phase_table(df, track=track)
+                    reports["events"] = detect_events(df, track=track)
+                    reports["stats_cube"] = build_stats_cube(df, track=track)
+                    rollups = lap_rollups(summary, reports["corner_phases"])
+                    for level, partials in rollups.items():
+                        reports[f"{level}_rollup"] = rollup_report(partials)
+                logger.info("Summary Engineering complete.")
+
+            elif stage == "targets":
+                df, summary = targets(df, summary, track)
+                logger.info("Target construction complete.")
+
+            if cache_dir:
+                save_stage_cache(df, cache_dir, stage)
+
+            timings[stage] = time.perf_counter() - start
+
+    # Reference outputs are cheap to load even when their stage was skipped
+    if left is None:
+        left = read_process_left(left_path, track)
+        right = read_process_right(right_path, track)
+    if line is None:
+        line = read_process_line(line_path, track)
 
     logger.info("Pipeline Complete.... Happy Exploring :-)")
     return df, left, right, line, summary
+
+
+def multi_track_pipeline(
+    data_path=None,
+    track_ids=None,
+    workers=1,
+    chunk_size=None,
+    cache_dir=None,
+    **options,
+):
+    """
+    Runs the pipeline for several tracks from a single scan of the raw data.
+
+    The raw CSV is read once and its rows routed by M_TRACKID; each of track_ids
+    (default: every track in the registry) found in the data then runs through
+    the stages of data_pipeline, one track per worker process. Track ids missing
+    from the registry are skipped with a warning. Stage caches go to
+    cache_dir/<track name>.
+
+    Returns {track_id: (df, left, right, line, summary, reports, timings)} with
+    each track's reports and stage timings (see data_pipeline); the keyword
+    options are passed on to data_pipeline (stages, backend, slicer, plan, ...).
+    """
+    if track_ids is None:
+        track_ids = list(TRACKS)
+    else:
+        for track_id in track_ids:
+            if track_id not in TRACKS:
+                logger.warning(f"Skipping track {track_id}: not in the track registry.")
+        track_ids = [track_id for track_id in track_ids if track_id in TRACKS]
+
+    partitions = read_tracks(
+        data_path, track_ids, chunk_size=chunk_size, workers=workers
+    )
+
+    jobs = {
+        track_id: partial(
+            track_pipeline,
+            track=track_id,
+            raw=raw,
+            cache_dir=cache_dir and os.path.join(cache_dir, TRACKS[track_id]["name"]),
+            **options,
+        )
+        for track_id, raw in partitions.items()
+    }
+
+    if workers is None or workers <= 1 or len(jobs) < 2:
+        return {track_id: job() for track_id, job in jobs.items()}
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+        futures = {track_id: executor.submit(job) for track_id, job in jobs.items()}
+        return {track_id: future.result() for track_id, future in futures.items()}
+
+
+def track_pipeline(**kwargs):
+    """
+    data_pipeline for one track of multi_track_pipeline, returning its outputs
+    followed by its own reports and timings dicts (a worker process cannot fill
+    dicts passed in by the parent).
+    """
+    reports = {}
+    timings = {}
+    outputs = data_pipeline(reports=reports, timings=timings, **kwargs)
+    return (*outputs, reports, timings)
+
+
+def copy_on_write():
+    """
+    Context in which the stages run. Stages never write into the frame they are
+    given: they return it with their new columns added (DataFrame.assign), or a
+    filtered frame. Under pandas copy-on-write the unchanged columns of those
+    frames are shared with the input rather than copied. Before pandas 3 the
+    option is only set for the duration of the context; from pandas 3 it is
+    always on.
+    """
+    if int(pd.__version__.split(".")[0]) < 3:
+        return pd.option_context("mode.copy_on_write", True)
+    return contextlib.nullcontext()
+
+
+def check_stages(stages):
+    """Validate a stage selection and return it in pipeline order."""
+    if stages is None:
+        return list(STAGES)
+
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        raise ValueError(f"Unknown stages {unknown}, expected some of {STAGES}")
+
+    positions = sorted(STAGES.index(s) for s in set(stages))
+    if positions != list(range(positions[0], positions[-1] + 1)):
+        raise ValueError(f"Stages must be consecutive, got {stages}")
+
+    return [STAGES[i] for i in positions]
+
+
+def stage_cache_path(cache_dir, stage):
+    return os.path.join(cache_dir, stage)
+
+
+def save_stage_cache(df, cache_dir, stage):
+    if os.path.exists(stage_cache_path(cache_dir, stage)):
+        shutil.rmtree(stage_cache_path(cache_dir, stage))
+    write_column_store(df, stage_cache_path(cache_dir, stage))
+
+
+def load_stage_cache(cache_dir, stage):
+    if not cache_dir or not os.path.exists(stage_cache_path(cache_dir, stage)):
+        raise FileNotFoundError(
+            f"No cached {stage} output in cache_dir={cache_dir!r}; "
+            f"run the {stage} stage with a cache directory first."
+        )
+    return column_store_frame(stage_cache_path(cache_dir, stage))
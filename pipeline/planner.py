@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+import logging
+from .cleaning import stutter_metrics
+from .spatial import OFFTRACK_THRESHOLD, track_limits_points
+from .track_raster import raster_contains, raster_edge_distance
+from .tracks import get_track
+
+logger = logging.getLogger(__name__)
+
+# Raw flags marking a lap as invalid, dropped later by remove_redundant_cols
+INVALID_FLAGS = ["M_LAPINVALID", "M_CURRENTLAPINVALID_1"]
+
+REASONS = ["stutter", "offtrack", "invalid", "few_points"]
+
+
+def plan_lap_rejections(
+    df,
+    left,
+    right,
+    min_points=500,
+    offtrack_threshold=OFFTRACK_THRESHOLD,
+    reject_invalid=False,
+    min_sector_points=None,
+    track=None,
+):
+    """
+    Evaluates every lap-level rejection rule up front, reading only lap_index,
+    the x/y position and the invalid-lap flags, so rejected laps can be dropped
+    before the per-row spatial and feature stages.
+
+    Returns one row per lap with the criteria, a boolean column per reason and
+    the overall rejected flag:
+        - stutter: fewer than min_points distinct positions (remove_stuttery_laps)
+        - offtrack: a point inside the sector more than offtrack_threshold metres
+          outside the track limits (enforce_track_limits)
+        - invalid: the game flagged the lap invalid (only rejects with reject_invalid)
+        - few_points: fewer than min_sector_points rows inside the sector
+          (only rejects when min_sector_points is given)
+
+    The sector is the slice polygon of track (a registry id, Albert Park by default).
+    """
+    track = get_track(track)
+    report = stutter_metrics(df)[["lap_index", "n_points"]]
+    lap_codes = pd.Index(report["lap_index"]).get_indexer(df["lap_index"])
+    n_laps = len(report)
+
+    x = df["M_WORLDPOSITIONX_1"].to_numpy(dtype=float)
+    y = df["M_WORLDPOSITIONY_1"].to_numpy(dtype=float)
+
+    # Points inside the sector (same test as track_slice)
+    xmin, xmax, ymin, ymax = track["slice_bounds"]
+    in_box = np.flatnonzero((x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax))
+    sector = np.array(track["slice_polygon"], float)
+    in_sector = in_box[raster_contains(sector, x[in_box], y[in_box])]
+
+    # Distance outside the track limits for sector points (as enforce_track_limits)
+    tracklims = track_limits_points(left, right)
+    dist = raster_edge_distance(tracklims, x[in_sector], y[in_sector])
+
+    sector_laps = lap_codes[in_sector]
+    report["n_sector_points"] = np.bincount(sector_laps, minlength=n_laps)
+    max_dist = np.zeros(n_laps)
+    np.maximum.at(max_dist, sector_laps, dist)
+    report["max_offtrack_distance"] = max_dist
+
+    invalid = np.zeros(n_laps, dtype=bool)
+    for flag in INVALID_FLAGS:
+        if flag in df.columns:
+            flagged = df[flag].fillna(0).to_numpy() != 0
+            invalid[np.unique(lap_codes[flagged])] = True
+
+    report["stutter"] = report["n_points"] < min_points
+    report["offtrack"] = report["max_offtrack_distance"] > offtrack_threshold
+    report["invalid"] = invalid
+    report["few_points"] = (
+        report["n_sector_points"] < min_sector_points
+        if min_sector_points is not None
+        else False
+    )
+
+    rejected = report["stutter"] | report["offtrack"] | report["few_points"]
+    if reject_invalid:
+        rejected |= report["invalid"]
+    report["rejected"] = rejected
+
+    return report
+
+
+def rejection_summary(report):
+    """Number of laps hit by each rejection reason, plus the totals."""
+    counts = {reason: int(report[reason].sum()) for reason in REASONS}
+    counts["rejected"] = int(report["rejected"].sum())
+    counts["kept"] = int((~report["rejected"]).sum())
+    return pd.Series(counts, name="laps")
+
+
+def apply_lap_plan(df, report):
+    """Drop the rows of every lap the plan rejected."""
+    kept = report.loc[~report["rejected"], "lap_index"]
+    return df[df["lap_index"].isin(kept)]
+
+
+def reject_laps(df, left, right, reports=None, **criteria):
+    """
+    Plan and apply the lap rejections in one step, storing the per-lap report in
+    reports["rejections"] when a dict is passed in.
+    """
+    report = plan_lap_rejections(df, left, right, **criteria)
+    counts = rejection_summary(report)
+    logger.info(
+        f"Rejected {counts['rejected']} of {len(report)} laps "
+        f"({', '.join(f'{r}: {counts[r]}' for r in REASONS)})."
+    )
+
+    if reports is not None:
+        reports["rejections"] = report
+    return apply_lap_plan(df, report)
@@ -0,0 +1,194 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+import logging
+from .column_store import MANIFEST
+from .corner_phases import segment_reduce
+from .targets import lap_segments
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHANNELS = [
+    "M_SPEED_1",
+    "M_THROTTLE_1",
+    "M_BRAKE_1",
+    "M_STEER_1",
+    "M_GEAR_1",
+    "M_ENGINERPM_1",
+    "M_DRS_1",
+]
+
+# Decimation factors: each level summarises blocks of this many consecutive samples
+FACTORS = [1, 4, 16, 64]
+
+STATS = ["min", "max", "mean"]
+
+
+def block_starts(starts, n_rows, factor):
+    """Start offsets of consecutive factor-sample blocks inside every lap segment."""
+    lengths = np.diff(np.r_[starts, n_rows])
+    n_blocks = -(-lengths // factor)
+    lap = np.repeat(np.arange(len(starts)), n_blocks)
+    within = np.arange(n_blocks.sum()) - np.repeat(
+        np.cumsum(n_blocks) - n_blocks, n_blocks
+    )
+    return starts[lap] + within * factor, np.r_[0, np.cumsum(n_blocks)]
+
+
+def build_pyramid(
+    df,
+    path,
+    channels=None,
+    distance_col="M_LAPDISTANCE_1",
+    factors=None,
+    dtype=np.float32,
+):
+    """
+    Writes a min/max/mean pyramid of each lap's channel traces over distance to
+    the directory path, one set of memory-mappable .npy files per level:
+        - offsets: start of every lap's blocks (laps[i] owns offsets[i]:offsets[i + 1])
+        - dist_lo / dist_hi: distance range covered by each block
+        - <channel>_min / _max / _mean: per block, ignoring NaN
+    Level f summarises blocks of f consecutive samples in distance order; level 1
+    is the samples themselves, so its min, max and mean share one file.
+
+    Every level is a segmented reduction over one ordering of the rows.
+    """
+    if channels is None:
+        channels = [c for c in DEFAULT_CHANNELS if c in df.columns]
+    if factors is None:
+        factors = FACTORS
+
+    df = df[df[distance_col].notna()]
+    laps, _, order, starts = lap_segments(df, "lap_index", distance_col)
+    dist = df[distance_col].to_numpy(dtype=np.float64)[order]
+    values = {c: df[c].to_numpy(dtype=np.float64)[order] for c in channels}
+
+    os.makedirs(path, exist_ok=True)
+
+    def save(name, array):
+        np.save(os.path.join(path, name), array, allow_pickle=False)
+        return name
+
+    levels = {}
+    for factor in factors:
+        prefix = f"{factor}x"
+        blocks, offsets = block_starts(starts, len(order), factor)
+        files = {"offsets": save(f"{prefix}_offsets.npy", offsets)}
+
+        if factor == 1:
+            files["dist_lo"] = files["dist_hi"] = save(f"{prefix}_dist.npy", dist)
+        else:
+            ends = np.r_[blocks[1:], len(order)] - 1
+            files["dist_lo"] = save(f"{prefix}_dist_lo.npy", dist[blocks])
+            files["dist_hi"] = save(f"{prefix}_dist_hi.npy", dist[ends])
+
+        for channel, v in values.items():
+            if factor == 1:
+                name = save(f"{prefix}_{channel}.npy", v.astype(dtype))
+                files.update({f"{channel}_{stat}": name for stat in STATS})
+                continue
+            for stat in STATS:
+                files[f"{channel}_{stat}"] = save(
+                    f"{prefix}_{channel}_{stat}.npy",
+                    segment_reduce(v, blocks, stat).astype(dtype),
+                )
+
+        levels[str(factor)] = {"n_blocks": int(offsets[-1]), "files": files}
+
+    manifest = {
+        "laps": np.asarray(laps).tolist(),
+        "channels": list(channels),
+        "distance": distance_col,
+        "factors": list(factors),
+        "levels": levels,
+    }
+    with open(os.path.join(path, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    logger.info(
+        f"Wrote a {len(factors)}-level pyramid of {len(channels)} channels "
+        f"for {len(laps)} laps to {path}."
+    )
+    return manifest
+
+
+def load_pyramid(path):
+    """Memory-map a pyramid written by build_pyramid. Returns (levels, manifest)."""
+    with open(os.path.join(path, MANIFEST)) as f:
+        manifest = json.load(f)
+
+    levels = {
+        int(factor): {
+            field: np.load(os.path.join(path, file), mmap_mode="r")
+            for field, file in level["files"].items()
+        }
+        for factor, level in manifest["levels"].items()
+    }
+    return levels, manifest
+
+
+def query_pyramid(path, channel, laps=None, distance=None, points=1000, pyramid=None):
+    """
+    Channel trace for laps (default all) over the distance range (lo, hi)
+    (default whole lap) at about points blocks per lap.
+
+    Reads the finest level with at most points blocks per lap in the range,
+    touching only those laps' slices of the memory-mapped files. Returns
+    (trace, factor): one row per block with lap_index, dist_lo, dist_hi and the
+    block's min, max and mean, and the decimation factor of the level read.
+    Pass pyramid=load_pyramid(path) to reuse the mapped files across queries.
+
+    Example Usage:
+    trace, factor = query_pyramid("output/pyramid", "M_SPEED_1", [3, 7], (300, 900), 200)
+    """
+    levels, manifest = pyramid if pyramid is not None else load_pyramid(path)
+    if channel not in manifest["channels"]:
+        raise KeyError(f"{channel} not in the pyramid at {path}")
+
+    lap_keys = pd.Index(manifest["laps"])
+    codes = np.arange(len(lap_keys)) if laps is None else lap_keys.get_indexer(laps)
+    if (codes < 0).any():
+        missing = np.asarray(laps)[codes < 0].tolist()
+        raise KeyError(f"Laps not in the pyramid at {path}: {missing}")
+    lo, hi = (-np.inf, np.inf) if distance is None else distance
+
+    def block_range(level, code):
+        # Blocks of a lap are in distance order, so both ends are binary searches
+        start, stop = level["offsets"][code], level["offsets"][code + 1]
+        first = start + np.searchsorted(level["dist_hi"][start:stop], lo, "left")
+        last = start + np.searchsorted(level["dist_lo"][start:stop], hi, "right")
+        return first, max(first, last)
+
+    # Finest level whose widest lap fits in points blocks
+    factors = sorted(levels)
+    finest = levels[factors[0]]
+    widest = 0
+    for code in codes:
+        first, last = block_range(finest, code)
+        widest = max(widest, last - first)
+    factor = next(
+        (f for f in factors if -(-widest * factors[0] // f) <= points), factors[-1]
+    )
+    level = levels[factor]
+
+    parts = []
+    for code in codes:
+        first, last = block_range(level, code)
+        parts.append(
+            pd.DataFrame(
+                {
+                    "lap_index": lap_keys[code],
+                    "dist_lo": level["dist_lo"][first:last],
+                    "dist_hi": level["dist_hi"][first:last],
+                    **{stat: level[f"{channel}_{stat}"][first:last] for stat in STATS},
+                }
+            )
+        )
+
+    columns = ["lap_index", "dist_lo", "dist_hi", *STATS]
+    trace = (
+        pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=columns)
+    )
+    return trace, factor
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import logging
+from .column_store import column_store_frame, lap_offsets, load_column_store
+
+logger = logging.getLogger(__name__)
+
+
+def select_laps(summary, where=None):
+    """
+    lap_index of the summary laps matching where: a DataFrame.query string, a
+    function of the summary returning a boolean mask, or a mask. summary is a
+    frame or the path of its column store.
+
+    Example Usage:
+    select_laps(summary, "avg_line_distance < 2 and sector_time <= sector_time.quantile(0.1)")
+    """
+    if isinstance(summary, str):
+        summary = column_store_frame(summary)
+    if where is None:
+        selected = summary
+    elif isinstance(where, str):
+        selected = summary.query(where, engine="python")
+    elif callable(where):
+        selected = summary[where(summary)]
+    else:
+        selected = summary[where]
+    return selected["lap_index"].to_numpy()
+
+
+def lap_ranges(path, laps):
+    """
+    Row ranges of laps in a lap-indexed column store, in the order of laps with
+    neighbouring ranges merged. Laps not in the store are skipped.
+    """
+    keys, offsets = lap_offsets(path)
+    codes = pd.Index(keys).get_indexer(laps)
+    codes = codes[codes >= 0]
+    starts, stops = offsets[codes], offsets[codes + 1]
+    if not len(starts):
+        return starts, stops
+
+    # Coalesce ranges that continue the previous one into a single read
+    first = np.flatnonzero(np.r_[True, starts[1:] != stops[:-1]])
+    last = np.r_[first[1:], len(starts)] - 1
+    return starts[first], stops[last]
+
+
+def fetch_laps(path, laps, columns=None):
+    """
+    Rows of laps from a lap-indexed column store (see write_column_store),
+    reading only those laps' row ranges of the requested columns. The cost
+    follows the size of the result, not of the store.
+    """
+    arrays = load_column_store(path, columns)
+    starts, stops = lap_ranges(path, np.asarray(laps))
+    return pd.DataFrame(
+        {
+            col: np.concatenate(
+                [values[start:stop] for start, stop in zip(starts, stops)]
+                or [values[:0]]
+            )
+            for col, values in arrays.items()
+        }
+    )
+
+
+def query_telemetry(path, summary, where=None, columns=None):
+    """
+    Telemetry rows of the laps whose summary matches where (see select_laps),
+    fetched from the lap-indexed telemetry column store at path with only the
+    given columns. Laps come back in summary order.
+
+    Example Usage:
+    query_telemetry(
+        "output/telemetry_columns",
+        "output/summary_columns",
+        "avg_line_distance < 2 and sector_time <= sector_time.quantile(0.1)",
+        columns=["lap_index", "M_LAPDISTANCE_1", "M_SPEED_1"],
+    )
+    """
+    laps = select_laps(summary, where)
+    df = fetch_laps(path, laps, columns)
+    logger.info(f"Fetched {len(df)} rows of {len(laps)} laps from {path}.")
+    return df
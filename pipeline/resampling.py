@@ -0,0 +1,180 @@
+import numpy as np
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHANNELS = [
+    "M_CURRENTLAPTIMEINMS_1",
+    "M_SPEED_1",
+    "M_BRAKE_1",
+    "M_THROTTLE_1",
+    "M_STEER_1",
+]
+
+
+def add_line_station(df, line):
+    """
+    Adds line_station, the along-track position (m) of each point measured on the
+    racing line. Each point is matched to its nearest racing line vertex and
+    projected onto the local line direction.
+    """
+    from scipy.spatial import cKDTree
+
+    line_points = line.sort_values("FRAME")[["WORLDPOSX", "WORLDPOSY"]].to_numpy()
+
+    seg = np.diff(line_points, axis=0)
+    seg_len = np.hypot(seg[:, 0], seg[:, 1])
+    arc = np.concatenate([[0.0], np.cumsum(seg_len)])
+
+    # Unit tangent at each vertex (last vertex reuses the final segment)
+    tangent = (
+        np.vstack([seg, seg[-1:]]) / np.concatenate([seg_len, seg_len[-1:]])[:, None]
+    )
+
+    points = df[["M_WORLDPOSITIONX_1", "M_WORLDPOSITIONY_1"]].to_numpy()
+    _, idx = cKDTree(line_points).query(points)
+
+    offset = np.einsum("ij,ij->i", points - line_points[idx], tangent[idx])
+    return df.assign(line_station=arc[idx] + offset)
+
+
+def resample_laps(
+    df,
+    channels=None,
+    distance_col="M_LAPDISTANCE_1",
+    step=0.5,
+    start=None,
+    stop=None,
+    origin=None,
+    dtype=np.float64,
+):
+    """
+    Puts every lap on a common distance grid using linear interpolation.
+
+    All laps are interpolated at once: rows are sorted by (lap_index, distance)
+    and offset by lap so a single searchsorted locates the bracketing samples
+    for every (lap, station) pair. Stations outside a lap's recorded distance
+    range are NaN.
+
+    origin optionally shifts each lap's distances before resampling (a Series
+    indexed by lap_index, e.g. the lap distance at the apex), so the grid is
+    relative to that point.
+
+    Returns (laps, stations, cube) where cube has shape
+    (len(laps), len(stations), len(channels)).
+
+    Example Usage:
+    laps, stations, cube = resample_laps(df, ["M_CURRENTLAPTIMEINMS_1", "M_SPEED_1"])
+    """
+    if channels is None:
+        channels = DEFAULT_CHANNELS
+
+    lap = df["lap_index"].to_numpy()
+    dist = df[distance_col].to_numpy(dtype=float)
+    laps, lap_pos = np.unique(lap, return_inverse=True)
+
+    if origin is not None:
+        origin = pd.Series(origin).reindex(laps).to_numpy(dtype=float)
+        dist = dist - origin[lap_pos]
+
+    keep = np.isfinite(dist)
+    lap_pos, dist = lap_pos[keep], dist[keep]
+
+    order = np.lexsort((dist, lap_pos))
+    lap_pos, dist = lap_pos[order], dist[order]
+
+    if not len(dist):
+        # No lap has a usable distance: every station is outside every lap
+        if start is None or stop is None:
+            stations = np.empty(0)
+        else:
+            stations = np.arange(start, stop + step / 2, step)
+        cube = np.full((len(laps), len(stations), len(channels)), np.nan, dtype=dtype)
+        return laps, stations, cube
+
+    if start is None:
+        start = np.floor(dist.min() / step) * step
+    if stop is None:
+        stop = dist.max()
+    stations = np.arange(start, stop + step / 2, step)
+
+    # Offset each lap into its own disjoint distance range so one sorted key
+    # covers all laps
+    base = min(dist.min(), stations[0])
+    span = max(dist.max(), stations[-1]) - base + 1.0
+    key = lap_pos * span + (dist - base)
+
+    counts = np.bincount(lap_pos, minlength=len(laps))
+    lap_end = np.cumsum(counts)
+    lap_start = lap_end - counts
+
+    query = np.arange(len(laps))[:, None] * span + (stations - base)[None, :]
+    pos = np.searchsorted(key, query, side="right")
+
+    # Laps without samples (counts == 0) are clamped onto a valid row and
+    # masked out by inside
+    first = np.minimum(lap_start, len(key) - 1)[:, None]
+    last = np.clip(lap_end - 1, first[:, 0], len(key) - 1)[:, None]
+    left = np.clip(pos - 1, first, last)
+    right = np.clip(pos, first, last)
+
+    inside = (counts[:, None] > 0) & (query >= key[first]) & (query <= key[last])
+
+    denom = key[right] - key[left]
+    weight = np.divide(
+        query - key[left], denom, out=np.zeros_like(query), where=denom > 0
+    )
+
+    cube = np.full((len(laps), len(stations), len(channels)), np.nan, dtype=dtype)
+    for c, channel in enumerate(channels):
+        values = df[channel].to_numpy(dtype=float)[keep][order]
+        v_left = values[left]
+        cube[:, :, c] = np.where(
+            inside, v_left + weight * (values[right] - v_left), np.nan
+        )
+
+    logger.info(
+        f"Resampled {len(laps)} laps onto {len(stations)} stations "
+        f"for {len(channels)} channels."
+    )
+    return laps, stations, cube
+
+
+def elapsed_time(times):
+    """
+    Converts resampled lap times (laps x stations, ms) into seconds elapsed since
+    each lap's first resampled station.
+    """
+    valid = np.isfinite(times)
+    first = np.argmax(valid, axis=1)
+    t0 = times[np.arange(len(times)), first]
+    return (times - t0[:, None]) / 1000
+
+
+def delta_time(times, reference=None):
+    """
+    Delta-time trace (s) of every lap against a reference lap on the common grid.
+
+    times is the laps x stations slice of the resampled lap time channel.
+    reference is the row of the reference lap; defaults to the fastest lap at the
+    furthest station covered by the most laps.
+    """
+    elapsed = elapsed_time(times)
+
+    if reference is None:
+        coverage = np.isfinite(elapsed).sum(axis=0)
+        station = np.flatnonzero(coverage == coverage.max())[-1]
+        reference = np.nanargmin(elapsed[:, station])
+
+    return elapsed - elapsed[reference][None, :]
+
+
+def first_crossing_station(values, stations, threshold):
+    """
+    Station of the first sample above threshold for every lap (NaN if never crossed).
+    Replaces per-lap loops such as first_braking_point with one array operation.
+    """
+    above = values > threshold
+    hit = above.any(axis=1)
+    return np.where(hit, stations[np.argmax(above, axis=1)], np.nan)
@@ -0,0 +1,166 @@
+import numpy as np
+import pandas as pd
+import logging
+from .targets import lap_segments
+
+logger = logging.getLogger(__name__)
+
+STATS = ["mean", "std", "min", "max"]
+
+# (channel, window, statistic): integer windows count samples, strings such as
+# "500ms" or "1s" are time windows over M_CURRENTLAPTIMEINMS_1
+DEFAULT_FEATURES = [
+    ("M_THROTTLE_1", 10, "mean"),
+    ("M_BRAKE_1", 10, "mean"),
+    ("M_BRAKE_1", 10, "max"),
+    ("M_STEER_1", "500ms", "std"),
+    ("M_SPEED_1", "500ms", "min"),
+    ("brake_front_rear_diff", "1s", "mean"),
+    ("brake_left_right_diff", "1s", "mean"),
+]
+
+
+def feature_name(channel, window, stat):
+    return f"{channel}_{stat}_{window}"
+
+
+def window_starts(window, lap_start, times):
+    """
+    First row of each row's trailing window, in lap/time order. Windows never
+    reach back past the start of the lap.
+    """
+    n = len(times)
+    if isinstance(window, (int, np.integer)):
+        if window < 1:
+            raise ValueError(f"Sample windows must be at least 1, got {window}")
+        return np.maximum(np.arange(n) - window + 1, lap_start)
+
+    length = pd.Timedelta(window).total_seconds() * 1000
+    if length <= 0:
+        raise ValueError(f"Time windows must be positive, got {window}")
+    if not n:
+        return np.empty(0, dtype=np.int64)
+
+    # Window is (t - length, t]. Offsetting each lap into its own time range
+    # lets one searchsorted find every start without crossing lap boundaries.
+    lap = np.cumsum(np.r_[0, np.diff(lap_start) != 0])
+    span = times.max() - times.min() + length + 1.0
+    key = lap * span + (times - times.min())
+    return np.searchsorted(key, key - length, side="right")
+
+
+def window_sums(values, begin, starts):
+    """
+    Count, sum and sum of squares over each window from cumulative sums. Values
+    are centred on their lap mean first so the sum of squares does not lose
+    precision on channels with a large offset (e.g. brake temperatures).
+    """
+    valid = ~np.isnan(values)
+    counts = np.add.reduceat(valid.astype(np.int64), starts)
+    totals = np.add.reduceat(np.where(valid, values, 0.0), starts)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        lap_mean = np.nan_to_num(totals / counts)
+    centre = np.repeat(lap_mean, np.diff(np.r_[starts, len(values)]))
+    centred = np.where(valid, values - centre, 0.0)
+
+    def window_total(x):
+        cum = np.r_[0.0, np.cumsum(x)]
+        return cum[1:] - cum[begin]
+
+    n = window_total(valid.astype(np.float64))
+    s = window_total(centred)
+    ss = window_total(centred * centred)
+    return n, s, ss, centre
+
+
+def window_extreme(values, begin, stat, backend="auto"):
+    """Rolling min or max over rows begin[i]..i, ignoring NaN."""
+    from .kernels import NUMBA_AVAILABLE
+
+    if backend == "auto":
+        backend = "numba" if NUMBA_AVAILABLE else "numpy"
+    sign = 1.0 if stat == "min" else -1.0
+
+    if backend == "numba":
+        if not NUMBA_AVAILABLE:
+            raise ImportError("backend='numba' requires numba to be installed.")
+        from .kernels import window_min_numba
+
+        return sign * window_min_numba(sign * values, begin)
+    if backend != "numpy":
+        raise ValueError(f"Unknown backend: {backend}")
+
+    return sign * sparse_table_min(sign * values, begin)
+
+
+def sparse_table_min(values, begin):
+    """
+    Range minimum over rows begin[i]..i with a sparse table: level j holds the
+    minimum of 2**j consecutive rows, and every window is covered by two
+    overlapping blocks of the largest level that fits.
+    """
+    end = np.arange(len(values))
+    length = end - begin + 1
+    level = np.floor(np.log2(length)).astype(np.int64)
+
+    out = np.empty(len(values))
+    table = values
+    for j in range(int(level.max()) + 1 if len(values) else 0):
+        if j > 0:
+            h = 1 << (j - 1)
+            table = np.r_[np.fmin(table[:-h], table[h:]), table[-h:]]
+        rows = np.flatnonzero(level == j)
+        out[rows] = np.fmin(table[begin[rows]], table[end[rows] - (1 << j) + 1])
+    return out
+
+
+def rolling_features(
+    df, features=None, time_col="M_CURRENTLAPTIMEINMS_1", backend="auto"
+):
+    """
+    Adds trailing rolling-window features per lap, one column per
+    (channel, window, statistic) triple, named <channel>_<stat>_<window>.
+
+    Rows are ordered by lap and time once; window starts are shared by every
+    feature with the same window. mean and std (sample, ddof=1) come from
+    cumulative sums, min and max from a monotonic deque (numba) or a sparse
+    table (numpy). Windows are partial at the start of each lap and skip NaN.
+
+    Example Usage:
+    df = rolling_features(df, [("M_THROTTLE_1", 10, "mean"), ("M_STEER_1", "500ms", "std")])
+    """
+    if features is None:
+        features = [f for f in DEFAULT_FEATURES if f[0] in df.columns]
+
+    _, codes, order, starts = lap_segments(df, "lap_index", time_col)
+    lap_start = starts[codes[order]]
+    times = df[time_col].to_numpy(dtype=np.float64)[order]
+
+    begins, sums, new = {}, {}, {}
+    for channel, window, stat in features:
+        if stat not in STATS:
+            raise ValueError(f"Unknown statistic {stat!r}, expected one of {STATS}")
+        if window not in begins:
+            begins[window] = window_starts(window, lap_start, times)
+        begin = begins[window]
+        values = df[channel].to_numpy(dtype=np.float64)[order]
+
+        if stat in ("min", "max"):
+            result = window_extreme(values, begin, stat, backend)
+        else:
+            if (channel, window) not in sums:
+                sums[channel, window] = window_sums(values, begin, starts)
+            n, s, ss, centre = sums[channel, window]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                if stat == "mean":
+                    result = np.where(n > 0, centre + s / n, np.nan)
+                else:
+                    var = (ss - s * s / n) / (n - 1)
+                    result = np.where(n > 1, np.sqrt(np.maximum(var, 0)), np.nan)
+
+        out = np.empty(len(df))
+        out[order] = result
+        new[feature_name(channel, window, stat)] = out
+
+    logger.info(f"Computed {len(new)} rolling-window features.")
+    return df.assign(**new)
@@ -0,0 +1,182 @@
+import numpy as np
+import pandas as pd
+import logging
+from .stats_cube import STATS, cube_key_columns, merge_cubes
+
+logger = logging.getLogger(__name__)
+
+LAP_KEYS = ["M_SESSIONUID", "M_CURRENTLAPNUM"]
+
+# Lap summary columns rolled up per session and stint. M_CURRENTLAPNUM itself
+# gives each group's lap count and first and last lap.
+SUMMARY_METRICS = [
+    "M_CURRENTLAPNUM",
+    "sector_time",
+    "avg_line_distance",
+    "dist_to_apex1",
+    "dist_to_apex2",
+    "avg_brake_pressure",
+    "avg_throttle_pressure",
+    "avg_brake_temperature",
+]
+
+# Corner-phase table columns rolled up per session, corner and phase
+PHASE_METRICS = ["min_speed", "exit_speed", "time_in_phase_ms", "peak_lateral_g"]
+
+# Mergeable partial aggregates: the stats cube statistics plus the sums needed
+# for a least-squares trend of each metric against the lap number
+PARTIALS = {**STATS, "sumx": "sum", "sumxx": "sum", "sumxy": "sum"}
+
+
+def assign_stints(summary, stint_gap=1, previous=None):
+    """
+    Stint of each lap, identified by the lap number it starts on. A stint is a
+    run of laps of one session whose lap numbers are at most stint_gap apart, so
+    a missing lap (pit stop, reset or rejected lap) starts a new one.
+
+    previous, a stint rollup, lets laps continue the last stint of a session
+    already rolled up.
+    """
+    session = summary["M_SESSIONUID"].to_numpy()
+    lap = summary["M_CURRENTLAPNUM"].to_numpy()
+    order = np.lexsort((lap, session))
+    s, l = session[order], lap[order]
+
+    new_session = np.r_[True, s[1:] != s[:-1]]
+    new_stint = new_session | np.r_[True, np.diff(l) > stint_gap]
+    start = l[np.maximum.accumulate(np.where(new_stint, np.arange(len(l)), 0))]
+
+    if previous is not None and len(previous) and len(l):
+        last = previous.sort_values("stint").groupby("M_SESSIONUID").last()
+        first = np.flatnonzero(new_session)
+        prev = last.reindex(s[first])
+        gap = l[first] - prev["M_CURRENTLAPNUM_max"].to_numpy()
+        joins = (gap > 0) & (gap <= stint_gap)
+        for i, stint in zip(first[joins], prev["stint"].to_numpy()[joins]):
+            start[(s == s[i]) & (start == start[i])] = stint
+
+    stints = np.empty(len(l), dtype=l.dtype)
+    stints[order] = start
+    return pd.Series(stints, index=summary.index, name="stint")
+
+
+def rollup_partials(table, keys, metrics, trend="M_CURRENTLAPNUM"):
+    """
+    Per-group partial aggregates of each metric (count, sum, sum of squares, min,
+    max and the trend sums against the trend column), NaN ignored. Partials of
+    disjoint sets of laps merge exactly with merge_rollups.
+    """
+    x = table[trend].to_numpy(dtype=np.float64)
+    columns = {}
+    for metric in metrics:
+        y = table[metric].to_numpy(dtype=np.float64)
+        valid = ~np.isnan(y)
+        xv = np.where(valid, x, np.nan)
+        columns.update(
+            {
+                f"{metric}_count": valid.astype(np.int64),
+                f"{metric}_sum": y,
+                f"{metric}_sumsq": y * y,
+                f"{metric}_min": y,
+                f"{metric}_max": y,
+                f"{metric}_sumx": xv,
+                f"{metric}_sumxx": xv * xv,
+                f"{metric}_sumxy": xv * y,
+            }
+        )
+
+    frame = pd.DataFrame(columns, index=table.index)
+    how = {c: PARTIALS[c.rsplit("_", 1)[1]] for c in frame.columns}
+    frame[keys] = table[keys]
+    return frame.groupby(keys, sort=True, dropna=False).agg(how).reset_index()
+
+
+def merge_rollups(*partials, by=None):
+    """Combine partials of disjoint laps, or roll them up to the by keys."""
+    return merge_cubes(*partials, by=by, stats=PARTIALS)
+
+
+def lap_rollups(summary, corner_phases=None, stint_gap=1, previous=None):
+    """
+    Mergeable partials above the lap level, from the lap summary and (optionally)
+    the corner-phase table only:
+        - session: per M_SESSIONUID
+        - stint: per M_SESSIONUID and stint (see assign_stints)
+        - corner: per M_SESSIONUID, corner and phase
+    """
+    summary_metrics = [m for m in SUMMARY_METRICS if m in summary.columns]
+    laps = summary.assign(stint=assign_stints(summary, stint_gap, previous))
+
+    rollups = {
+        "session": rollup_partials(laps, ["M_SESSIONUID"], summary_metrics),
+        "stint": rollup_partials(laps, ["M_SESSIONUID", "stint"], summary_metrics),
+    }
+    if corner_phases is not None:
+        keys = summary.set_index("lap_index")[LAP_KEYS]
+        phases = corner_phases.join(keys, on="lap_index", how="inner")
+        phases = phases.assign(
+            corner=phases["corner"].astype(str), phase=phases["phase"].astype(str)
+        )
+        rollups["corner"] = rollup_partials(
+            phases,
+            ["M_SESSIONUID", "corner", "phase"],
+            [m for m in PHASE_METRICS if m in phases.columns],
+        )
+    return rollups
+
+
+def update_rollups(rollups, summary, corner_phases=None, stint_gap=1):
+    """
+    Add laps not yet rolled up (a new session, or later laps of one) to existing
+    partials without touching the laps already in them. Laps that directly
+    follow a session's last stint continue it.
+    """
+    added = lap_rollups(summary, corner_phases, stint_gap, rollups.get("stint"))
+    return {
+        level: merge_rollups(rollups[level], partials) if level in rollups else partials
+        for level, partials in added.items()
+    }
+
+
+def rollup_report(partials):
+    """
+    Readable table of rollup partials: per group the lap count, first and last
+    lap, and for every metric its mean, std (sample), min, max and drift (least
+    squares slope per lap, e.g. brake temperature rise over a stint).
+
+    For the session rollup, sector_time_min is the best lap and sector_time_std
+    the consistency.
+    """
+    keys = cube_key_columns(partials, PARTIALS)
+    metrics = list(
+        dict.fromkeys(
+            c.rsplit("_", 1)[0] for c in partials.columns if c.endswith("_count")
+        )
+    )
+
+    report = {k: partials[k].to_numpy() for k in keys}
+    if "M_CURRENTLAPNUM" in metrics:
+        report["n_laps"] = partials["M_CURRENTLAPNUM_count"].to_numpy()
+        report["first_lap"] = partials["M_CURRENTLAPNUM_min"].to_numpy()
+        report["last_lap"] = partials["M_CURRENTLAPNUM_max"].to_numpy()
+        metrics.remove("M_CURRENTLAPNUM")
+
+    for m in metrics:
+        n = partials[f"{m}_count"].to_numpy(dtype=np.float64)
+        s, ss = partials[f"{m}_sum"].to_numpy(), partials[f"{m}_sumsq"].to_numpy()
+        sx, sxx = partials[f"{m}_sumx"].to_numpy(), partials[f"{m}_sumxx"].to_numpy()
+        sxy = partials[f"{m}_sumxy"].to_numpy()
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = np.where(n > 0, s / n, np.nan)
+            var = np.where(n > 1, (ss - s * mean) / (n - 1), np.nan)
+            spread = n * sxx - sx * sx
+            drift = np.where(spread > 0, (n * sxy - sx * s) / spread, np.nan)
+
+        report[f"{m}_mean"] = mean
+        report[f"{m}_std"] = np.sqrt(np.maximum(var, 0))
+        report[f"{m}_min"] = partials[f"{m}_min"].to_numpy()
+        report[f"{m}_max"] = partials[f"{m}_max"].to_numpy()
+        report[f"{m}_drift"] = drift
+
+    return pd.DataFrame(report)
@@ -1,102 +1,136 @@
 import pandas as pd
-from shapely.geometry import Polygon, Point, LineString
 import numpy as np
 from .loading import read_process_left, read_process_right
+from .parallel import map_chunks
+from .track_raster import get_raster, raster_contains, raster_edge_distance
+from .tracks import get_track
 import logging
 
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
-)
 logger = logging.getLogger(__name__)
 
+# Maximum distance (m) a point may be outside the track limits before its lap is removed
+OFFTRACK_THRESHOLD = 5
 
-def spatial(df):
-    # Slice the track data to be between selected track start and finish lines for this sector
-    df = track_slice(df)
-    logger.info("Sliced track coordinates.")
+
+def spatial(
+    df,
+    left_path=None,
+    right_path=None,
+    workers=1,
+    slicer="polygon",
+    enforce_limits=True,
+    track=None,
+    raster_dir=None,
+):
+    """
+    Spatial stage: slice the laps to the sector and drop laps that leave the
+    track limits. Both polygon tests use rasters precomputed once per polygon
+    before any work is handed to workers, saved as .npy under raster_dir when
+    given (see track_raster).
+    """
+    track = get_track(track)
 
     # Load track limits
-    left = read_process_left()
-    right = read_process_right()
+    left = read_process_left(left_path, track)
+    right = read_process_right(right_path, track)
     logger.info("Track limits loaded.")
 
+    # Build (or load) each polygon's raster here, once, so the worker processes
+    # inherit it or load it from raster_dir instead of each building and saving it
+    if slicer == "polygon":
+        get_raster(np.array(track["slice_polygon"], float), cache_dir=raster_dir)
+    if enforce_limits:
+        get_raster(track_limits_points(left, right), cache_dir=raster_dir)
+
+    # Slice the track data to be between selected track start and finish lines for this sector
+    if slicer == "gates":
+        start_line, end_line = define_gates(left, right, track)
+        df = gate_slice(df, start_line, end_line)
+        logger.info("Sliced laps between the start and finish cut lines.")
+    elif slicer == "polygon":
+        df = map_chunks(track_slice, df, workers, track=track, raster_dir=raster_dir)
+        logger.info("Sliced track coordinates.")
+    else:
+        raise ValueError(f"Unknown slicer: {slicer}")
+
     # Enforce track limits, to ensure laps wildly off track are removed.
-    df = enforce_track_limits(df, left, right)
-    logger.info("Enforced track limits.")
+    # Skipped when the lap planner has already rejected off-track laps.
+    if enforce_limits:
+        df = enforce_track_limits(
+            df, left, right, workers=workers, raster_dir=raster_dir
+        )
+        logger.info("Enforced track limits.")
 
     return df, left, right
 
 
-def track_slice(df):
+def track_slice(df, track=None, raster_dir=None):
+    """
+    Keep the points inside the track's sector polygon, looked up in its
+    precomputed raster (exact test only next to the polygon edges).
+    """
+    track = get_track(track)
+    xmin, xmax, ymin, ymax = track["slice_bounds"]
     df = df[
-        (df["M_WORLDPOSITIONX_1"] >= 0)
-        & (df["M_WORLDPOSITIONX_1"] <= 600)
-        & (df["M_WORLDPOSITIONY_1"] >= -200)
-        & (df["M_WORLDPOSITIONY_1"] <= 600)
+        (df["M_WORLDPOSITIONX_1"] >= xmin)
+        & (df["M_WORLDPOSITIONX_1"] <= xmax)
+        & (df["M_WORLDPOSITIONY_1"] >= ymin)
+        & (df["M_WORLDPOSITIONY_1"] <= ymax)
     ]
 
-    track_points = np.array(
-        [
-            [152.5310179012927, 413.5544859306186],
-            [161.76398481864388, 423.11538718965284],
-            [572, 423],
-            [572.051098447852, -131.86683911251717],
-            [564.8183173166642, -138.23284559314058],
-            [152, -138],
-        ],
-        float,
-    )
-
-    polygon = Polygon(track_points)
-
-    mask = df.apply(
-        lambda row: polygon.contains(
-            Point(row["M_WORLDPOSITIONX_1"], row["M_WORLDPOSITIONY_1"])
-        ),
-        axis=1,
+    mask = raster_contains(
+        np.array(track["slice_polygon"], float),
+        df["M_WORLDPOSITIONX_1"].to_numpy(dtype=float),
+        df["M_WORLDPOSITIONY_1"].to_numpy(dtype=float),
+        cache_dir=raster_dir,
     )
 
     return df[mask]
 
 
-def enforce_track_limits(df, left, right):
+def enforce_track_limits(df, left, right, workers=1, raster_dir=None):
     """Remove laps where any telemetry point exceeds a given distance from track edges."""
-    threshold = 5
-    # Combine track edges
-    track_points = np.vstack(
-        [
-            left[["WORLDPOSX", "WORLDPOSY"]].values,
-            right[["WORLDPOSX", "WORLDPOSY"]].values,
-        ]
+    threshold = OFFTRACK_THRESHOLD
+
+    dist_to_track = map_chunks(
+        distance_to_track,
+        df,
+        workers,
+        left=left,
+        right=right,
+        threshold=threshold,
+        raster_dir=raster_dir,
     )
-    tracklims = Polygon(track_points)
 
-    df["inside_track"] = df.apply(
-        lambda row: tracklims.contains(
-            Point(row["M_WORLDPOSITIONX_1"], row["M_WORLDPOSITIONY_1"])
-        ),
-        axis=1,
-    )
+    offtrack_laps = df.loc[dist_to_track > threshold, "lap_index"].unique()
 
-    df["dist_to_track"] = df.apply(
-        lambda row: (
-            0
-            if row["inside_track"]
-            else tracklims.exterior.distance(
-                Point(row["M_WORLDPOSITIONX_1"], row["M_WORLDPOSITIONY_1"])
-            )
-        ),
-        axis=1,
-    )
+    return df[~df["lap_index"].isin(offtrack_laps)]
 
-    offtrack_laps = df[df["dist_to_track"] > threshold][["lap_index"]].drop_duplicates()
 
-    df = df.merge(offtrack_laps, on=["lap_index"], how="left", indicator=True)
-    df = df[df["_merge"] == "left_only"].drop(
-        columns=["_merge", "inside_track", "dist_to_track"]
+def distance_to_track(df, left, right, threshold=None, raster_dir=None):
+    """
+    Distance of each point outside the track limits polygon to its edge (0 if
+    inside), from the polygon's raster. With threshold, distances are only exact
+    where needed to compare them with threshold (see raster_edge_distance).
+    """
+    distance = raster_edge_distance(
+        track_limits_points(left, right),
+        df["M_WORLDPOSITIONX_1"].to_numpy(dtype=float),
+        df["M_WORLDPOSITIONY_1"].to_numpy(dtype=float),
+        threshold=threshold,
+        cache_dir=raster_dir,
     )
+    return pd.Series(distance, index=df.index)
 
-    return df
+
+def track_limits_points(left, right):
+    """Combine the left and right track edges into the vertices of the track limits polygon."""
+    return np.vstack(
+        [
+            left[["WORLDPOSX", "WORLDPOSY"]].values,
+            right[["WORLDPOSX", "WORLDPOSY"]].values,
+        ]
+    )
 
 
 def find_nearest_point(df_ref, x, y):
@@ -112,7 +146,7 @@ def find_nearest_point(df_ref, x, y):
     return idx_nearest
 
 
-def define_cut_line(df_right, df_left, x, y):
+def define_cut_line(df_right, df_left, x, y, verbose=True):
     """
     Defines a perpendicular line ("cut line") across the track between the right and left boundaries.
     The line starts at the nearest point on the right boundary to (x, y) and extends perpendicularly
@@ -121,6 +155,8 @@ def define_cut_line(df_right, df_left, x, y):
     start_line = define_cut_line(right, left, x=152.5310179012927, y=413.5544859306186)
     end_line   = define_cut_line(right, left,  x=564.8183173166642, y=-138.23284559314058)
     """
+    from shapely.geometry import LineString
+
     # Sort both left and right boundaries by frame to ensure sequential order
     df_right = df_right.sort_values(by="FRAME", ascending=True).reset_index(drop=True)
     df_left = df_left.sort_values(by="FRAME", ascending=True).reset_index(drop=True)
@@ -157,9 +193,123 @@ def define_cut_line(df_right, df_left, x, y):
 
     cut_line = LineString([(float(x), float(y)), (left_x, left_y)])
 
-    print("Cut line:")
-    print(cut_line)
-    print(f"Right border coordinate: ({float(x):.3f}, {float(y):.3f})")
-    print(f"Left border coordinate:  ({left_x:.3f}, {left_y:.3f})")
+    if verbose:
+        print("Cut line:")
+        print(cut_line)
+        print(f"Right border coordinate: ({float(x):.3f}, {float(y):.3f})")
+        print(f"Left border coordinate:  ({left_x:.3f}, {left_y:.3f})")
 
     return cut_line, (float(x), float(y)), (left_x, float(left_y))
+
+
+def define_gates(left, right, track=None):
+    """Start and finish cut lines of the sector as ((x1, y1), (x2, y2)) segments."""
+    track = get_track(track)
+    _, start_right, start_left = define_cut_line(
+        right, left, *track["start_gate"], verbose=False
+    )
+    _, end_right, end_left = define_cut_line(
+        right, left, *track["end_gate"], verbose=False
+    )
+    return (start_right, start_left), (end_right, end_left)
+
+
+def segment_crossings(x0, y0, x1, y1, gate):
+    """
+    Vectorised segment intersection of the trajectory segments (x0, y0) -> (x1, y1)
+    with a gate segment. Returns a mask of crossing segments and, for each, the
+    fraction along the trajectory segment where the crossing happens.
+    """
+    (gx0, gy0), (gx1, gy1) = gate
+    gdx, gdy = gx1 - gx0, gy1 - gy0
+    dx, dy = x1 - x0, y1 - y0
+
+    denom = dx * gdy - dy * gdx
+    ox, oy = gx0 - x0, gy0 - y0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = (ox * gdy - oy * gdx) / denom  # along the trajectory segment
+        u = (ox * dy - oy * dx) / denom  # along the gate
+
+    hit = (denom != 0) & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+    return hit, t
+
+
+def gate_crossings(df, start_line, end_line):
+    """
+    Finds, for each lap, where the trajectory first crosses the start cut line and
+    then the finish cut line, with crossing times interpolated along the crossing
+    segment.
+
+    Returns the rows sorted by (lap_index, M_CURRENTLAPTIMEINMS_1) and a per-lap
+    dataframe with the row positions (in that order) of both crossing segments and
+    the interpolated sector_start_ms / sector_end_ms.
+    """
+    df = df.sort_values(["lap_index", "M_CURRENTLAPTIMEINMS_1"], kind="stable")
+
+    lap = df["lap_index"].to_numpy()
+    x = df["M_WORLDPOSITIONX_1"].to_numpy(dtype=float)
+    y = df["M_WORLDPOSITIONY_1"].to_numpy(dtype=float)
+    t = df["M_CURRENTLAPTIMEINMS_1"].to_numpy(dtype=float)
+
+    # Segment k joins row k to row k + 1 within the same lap
+    same_lap = lap[:-1] == lap[1:]
+    seg = (x[:-1], y[:-1], x[1:], y[1:])
+
+    def first_crossing(gate, after):
+        hit, frac = segment_crossings(*seg, gate)
+        hit &= same_lap
+        rows = np.flatnonzero(hit)
+        rows = rows[rows > after[lap[rows]]] if after is not None else rows
+        # Keep the first crossing in each lap (rows are sorted by lap then time)
+        first = (
+            rows[np.r_[True, lap[rows][1:] != lap[rows][:-1]]] if len(rows) else rows
+        )
+        times = t[first] + frac[first] * (t[first + 1] - t[first])
+        return pd.DataFrame({"lap_index": lap[first], "row": first, "time": times})
+
+    start = first_crossing(start_line, None)
+
+    # Only finish crossings after the lap's start crossing count
+    after = np.full(lap.max() + 1 if len(lap) else 0, np.iinfo(np.int64).max)
+    after[start["lap_index"].to_numpy()] = start["row"].to_numpy()
+    end = first_crossing(end_line, after)
+
+    crossings = start.merge(end, on="lap_index", suffixes=("_start", "_end"))
+    crossings = crossings.rename(
+        columns={
+            "row_start": "start_row",
+            "row_end": "end_row",
+            "time_start": "sector_start_ms",
+            "time_end": "sector_end_ms",
+        }
+    )
+    return df, crossings
+
+
+def gate_slice(df, start_line, end_line):
+    """
+    Keeps only the rows recorded between each lap's start and finish gate
+    crossings, in a single vectorised pass. Laps that do not cross both gates are
+    dropped. The interpolated crossing times are broadcast to every row of the
+    lap as sector_start_ms and sector_end_ms.
+    """
+    df, crossings = gate_crossings(df, start_line, end_line)
+
+    n = len(df)
+    # +1 at the first row after the start crossing, -1 after the last row before
+    # the finish crossing; the running sum marks the rows in between
+    marks = np.zeros(n + 1, dtype=np.int64)
+    np.add.at(marks, crossings["start_row"].to_numpy() + 1, 1)
+    np.add.at(marks, crossings["end_row"].to_numpy() + 1, -1)
+    keep = np.cumsum(marks[:-1]) > 0
+
+    df = df[keep]
+
+    times = crossings.set_index("lap_index")
+    lap = df["lap_index"]
+    df = df.assign(
+        sector_start_ms=lap.map(times["sector_start_ms"]).to_numpy(),
+        sector_end_ms=lap.map(times["sector_end_ms"]).to_numpy(),
+    )
+    return df
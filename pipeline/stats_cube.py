@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+import logging
+from .corner_phases import segment_reduce
+from .tracks import get_track
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHANNELS = ["M_SPEED_1", "M_BRAKE_1", "M_THROTTLE_1", "M_STEER_1"]
+
+# Sufficient statistics kept per channel and how two cubes combine them
+STATS = {"count": "sum", "sum": "sum", "sumsq": "sum", "min": "min", "max": "max"}
+
+# Spatial binning: a position column cut into bin_size intervals, or an x/y grid
+BINNINGS = {
+    "distance": ["M_LAPDISTANCE_1"],
+    "station": ["line_station"],
+    "xy": ["M_WORLDPOSITIONX_1", "M_WORLDPOSITIONY_1"],
+}
+
+
+def stat_column(channel, stat):
+    return f"{channel}_{stat}"
+
+
+def cube_keys(df, binning="distance", bin_size=1.0, corners=True, track=None):
+    """
+    Key columns of every row: the lower edge of its spatial bin(s), its
+    M_SESSIONUID and, with corners, the corner whose turning window it is in
+    ("none" outside every window).
+    """
+    if binning not in BINNINGS:
+        raise ValueError(
+            f"Unknown binning {binning!r}, expected one of {list(BINNINGS)}"
+        )
+
+    keys = {}
+    for col in BINNINGS[binning]:
+        values = df[col].to_numpy(dtype=np.float64)
+        keys[f"{col}_bin"] = np.floor(values / bin_size) * bin_size
+    keys["M_SESSIONUID"] = df["M_SESSIONUID"].to_numpy()
+
+    if corners:
+        corner = np.full(len(df), "none", dtype=object)
+        # Later corners are written first so the first matching window wins
+        for name in reversed(list(get_track(track)["corners"])):
+            corner[df[f"is_{name}_window"].to_numpy(dtype=bool)] = name.upper()
+        keys["corner"] = corner
+    return keys
+
+
+def build_stats_cube(
+    df, channels=None, binning="distance", bin_size=1.0, corners=True, track=None
+):
+    """
+    Statistics cube of df: one row per (spatial bin, session[, corner]) key with
+    the count, sum, sum of squares, min and max of every channel (NaN ignored).
+
+    These statistics are mergeable, so cubes built from separate chunks or
+    sessions combine exactly with merge_cubes, and cube_summary turns any
+    roll-up into means and standard deviations. Rows without a position are
+    left out.
+
+    Example Usage:
+    cube = build_stats_cube(df, bin_size=5.0)
+    cube = merge_cubes(cube, build_stats_cube(new_session, bin_size=5.0))
+    """
+    if channels is None:
+        channels = [c for c in DEFAULT_CHANNELS if c in df.columns]
+
+    keys = cube_keys(df, binning, bin_size, corners, track)
+    bins = [k for k in keys if k.endswith("_bin")]
+    has_position = np.all([~np.isnan(keys[k]) for k in bins], axis=0)
+    keys = {k: v[has_position] for k, v in keys.items()}
+
+    codes, uniques = pd.MultiIndex.from_arrays(list(keys.values())).factorize(sort=True)
+    order = np.argsort(codes, kind="stable")
+    starts = np.flatnonzero(np.r_[True, np.diff(codes[order]) != 0])
+    if not len(order):
+        starts = starts[:0]
+
+    cube = pd.MultiIndex.from_tuples(uniques, names=list(keys)).to_frame(index=False)
+    for channel in channels:
+        values = df[channel].to_numpy(dtype=np.float64)[has_position][order]
+        cube[stat_column(channel, "count")] = segment_reduce(values, starts, "count")
+        cube[stat_column(channel, "sum")] = segment_reduce(values, starts, "sum")
+        cube[stat_column(channel, "sumsq")] = segment_reduce(
+            values * values, starts, "sum"
+        )
+        cube[stat_column(channel, "min")] = segment_reduce(values, starts, "min")
+        cube[stat_column(channel, "max")] = segment_reduce(values, starts, "max")
+
+    logger.info(
+        f"Built a statistics cube of {len(cube)} cells over {len(order)} rows "
+        f"and {len(channels)} channels."
+    )
+    return cube
+
+
+def cube_key_columns(cube, stats=STATS):
+    return [c for c in cube.columns if not c.endswith(tuple(f"_{s}" for s in stats))]
+
+
+def merge_cubes(*cubes, by=None, stats=STATS):
+    """
+    Combine cubes (or roll one up) by adding counts and sums and taking the
+    extreme min and max of every cell with the same key. by keeps only those key
+    columns, e.g. by=["M_LAPDISTANCE_1_bin"] merges every session and corner.
+    stats maps each statistic suffix to how it merges.
+    """
+    cube = pd.concat(cubes, ignore_index=True)
+    key_columns = cube_key_columns(cube, stats)
+    keys = key_columns if by is None else list(by)
+    how = {c: stats[c.rsplit("_", 1)[1]] for c in cube.columns if c not in key_columns}
+    return cube.groupby(keys, sort=True, dropna=False).agg(how).reset_index()
+
+
+def cube_summary(cube, channel, by=None):
+    """
+    count, mean, std (sample), min and max of channel per cell, after rolling
+    the cube up to the by key columns when given.
+
+    Example Usage:
+    cube_summary(cube[cube["M_SESSIONUID"] == session], "M_SPEED_1", by=["M_LAPDISTANCE_1_bin"])
+    """
+    if by is not None:
+        cube = merge_cubes(cube, by=by)
+    n = cube[stat_column(channel, "count")].to_numpy(dtype=np.float64)
+    s = cube[stat_column(channel, "sum")].to_numpy()
+    ss = cube[stat_column(channel, "sumsq")].to_numpy()
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.where(n > 0, s / n, np.nan)
+        var = np.where(n > 1, (ss - s * mean) / (n - 1), np.nan)
+
+    return cube[cube_key_columns(cube)].assign(
+        count=n.astype(np.int64),
+        mean=mean,
+        std=np.sqrt(np.maximum(var, 0)),
+        min=cube[stat_column(channel, "min")].to_numpy(),
+        max=cube[stat_column(channel, "max")].to_numpy(),
+    )
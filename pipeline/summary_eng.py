@@ -1,24 +1,26 @@
 import pandas as pd
-from scipy.spatial import cKDTree
 import logging
+from .events import detect_events
+from .tracks import get_track
 
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
-)
 logger = logging.getLogger(__name__)
 
 
-def summary_eng(df):
+def summary_eng(df, track=None):
     # Creates the summary dataframe containing lap-level statistics.
     summary = initialise_lap_summary(df)
     logger.info("Created summary dataframe.")
 
+    # Session and lap number of each lap, so sessions and stints can be rolled up
+    # from the summary alone (see rollups).
+    summary = add_lap_keys(df, summary)
+
     # Calculates the average deviation from the racing line.
     summary = avg_line_distance(df, summary)
     logger.info("Calculated average distance to racing line.")
 
     # Calculates the minimum distances to either apex.
-    summary = min_apex_distance(df, summary)
+    summary = min_apex_distance(df, summary, track)
     logger.info("Calculated minimum distance to apex 1 and 2.")
 
     # Calculating average brake and throttle pressure.
@@ -31,6 +33,10 @@ def summary_eng(df):
     summary = add_peak_throttle_pressure(df, summary)
     logger.info("Calculated peak brake and throttle pressure per lap.")
 
+    # Average brake temperature across the four corners.
+    summary = add_avg_brake_temperature(df, summary)
+    logger.info("Calculated average brake temperature per lap.")
+
     # Calculating brake and turning points.
     summary = first_braking_point(df, summary)
     summary = first_turning_point(df, summary)
@@ -43,7 +49,22 @@ def initialise_lap_summary(df):
     """
     Create a summary dataframe per lap with lap index and sector_time.
     sector_time is computed as the difference between the first and last CURRENTLAPTIME in seconds.
+
+    When the laps were sliced with spatial.gate_slice, sector_time is instead the
+    difference between the interpolated gate crossing times.
     """
+    if "sector_start_ms" in df.columns:
+        times = df.groupby("lap_index", sort=False)[
+            ["sector_start_ms", "sector_end_ms"]
+        ].first()
+        return pd.DataFrame(
+            {
+                "lap_index": times.index.to_numpy(),
+                "sector_time": (
+                    (times["sector_end_ms"] - times["sector_start_ms"]) / 1000
+                ).to_numpy(),
+            }
+        )
 
     def time_to_seconds(t):
         """Convert 'M:SS.sss' string to seconds."""
@@ -63,6 +84,12 @@ def initialise_lap_summary(df):
     return summary
 
 
+def add_lap_keys(df, summary):
+    keys = df.groupby("lap_index")[["M_SESSIONUID", "M_CURRENTLAPNUM"]].first()
+    summary = summary.merge(keys.reset_index(), on="lap_index", how="left")
+    return summary
+
+
 def avg_line_distance(df, summary):
     """
     Calculate the average distance from the racing line per lap
@@ -75,9 +102,12 @@ def avg_line_distance(df, summary):
     return summary
 
 
-def min_apex_distance(df, summary):
-    p1 = (375.57, 191.519)
-    p2 = (368.93, 90.0)
+def min_apex_distance(df, summary, track=None):
+    from scipy.spatial import cKDTree
+
+    track = get_track(track)
+    p1 = track["corners"]["t1"]
+    p2 = track["corners"]["t2"]
     rows = []
     for i in df["lap_index"].unique():
         lap = df[df["lap_index"] == i]
@@ -135,51 +165,54 @@ def add_peak_throttle_pressure(df, summary):
     return summary
 
 
-def first_braking_point(df, summary, brake_thresh=0.2):
-    rows = []
-    for i in df["lap_index"].unique():
-        lap = df[df["lap_index"] == i]
-        braking_points = lap[lap["M_BRAKE_1"] > brake_thresh]
-        if not braking_points.empty:
-            first_brake = braking_points.iloc[0]
-            rows.append(
-                (
-                    i,
-                    first_brake["M_WORLDPOSITIONX_1"],
-                    first_brake["M_WORLDPOSITIONY_1"],
-                    first_brake["M_BRAKE_1"],
-                )
-            )
-        else:
-            rows.append((i, None, None, 0))
-
-    brake_df = pd.DataFrame(
-        rows, columns=["lap_index", "brake_x", "brake_y", "brake_pressure"]
+def add_avg_brake_temperature(df, summary):
+    temps = [f"M_BRAKESTEMPERATURE_{w}_1" for w in ("RL", "RR", "FL", "FR")]
+    avg = (
+        df[temps]
+        .mean(axis=1)
+        .groupby(df["lap_index"])
+        .mean()
+        .reset_index(name="avg_brake_temperature")
+    )
+    summary = summary.merge(avg, on="lap_index", how="left")
+    return summary
+
+
+def first_event_point(df, summary, channel, thresh, columns, use_abs=False):
+    """
+    Position and channel value where each lap first exceeds thresh, from the
+    event engine with a single threshold (no hysteresis or minimum duration).
+    Laps that never exceed it get no position and a value of 0.
+    """
+    rule = {"channel": channel, "on": thresh, "off": thresh, "abs": use_abs}
+    events = detect_events(df, {"first": rule}, positions=True)
+    first = events.drop_duplicates("lap_index")
+
+    points = pd.DataFrame(
+        {
+            "lap_index": first["lap_index"].to_numpy(),
+            columns[0]: first["x"].to_numpy(),
+            columns[1]: first["y"].to_numpy(),
+            columns[2]: df[channel].iloc[first["position"].astype("int64")].to_numpy(),
+        }
     )
-    summary = pd.merge(summary, brake_df, on="lap_index", how="left")
+    summary = pd.merge(summary, points, on="lap_index", how="left")
+    summary[columns[2]] = summary[columns[2]].fillna(0)
     return summary
 
 
+def first_braking_point(df, summary, brake_thresh=0.2):
+    return first_event_point(
+        df, summary, "M_BRAKE_1", brake_thresh, ["brake_x", "brake_y", "brake_pressure"]
+    )
+
+
 def first_turning_point(df, summary, turn_thresh=0.2):
-    rows = []
-    for i in df["lap_index"].unique():
-        lap = df[df["lap_index"] == i]
-        turning_points = lap[lap["M_STEER_1"].abs() > turn_thresh]
-        if not turning_points.empty:
-            first_turn = turning_points.iloc[0]
-            rows.append(
-                (
-                    i,
-                    first_turn["M_WORLDPOSITIONX_1"],
-                    first_turn["M_WORLDPOSITIONY_1"],
-                    first_turn["M_STEER_1"],
-                )
-            )
-        else:
-            rows.append((i, None, None, 0))
-
-    turn_df = pd.DataFrame(
-        rows, columns=["lap_index", "turn_x", "turn_y", "steering_angle"]
+    return first_event_point(
+        df,
+        summary,
+        "M_STEER_1",
+        turn_thresh,
+        ["turn_x", "turn_y", "steering_angle"],
+        use_abs=True,
     )
-    summary = pd.merge(summary, turn_df, on="lap_index", how="left")
-    return summary
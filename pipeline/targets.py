@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+import logging
+from .tracks import get_track
+
+logger = logging.getLogger(__name__)
+
+
+def lap_segments(df, lap_cols="lap_index", time_col="M_CURRENTLAPTIMEINMS_1"):
+    """
+    Orders the rows by lap then time without sorting the frame.
+
+    Returns the lap keys, each row's lap code, the row order and the start
+    offset of every lap within that order (laps[i] owns
+    order[starts[i]:starts[i + 1]]).
+    """
+    lap_cols = [lap_cols] if isinstance(lap_cols, str) else list(lap_cols)
+    if len(lap_cols) == 1:
+        codes, laps = pd.factorize(df[lap_cols[0]], sort=True)
+    else:
+        codes, laps = pd.MultiIndex.from_frame(df[lap_cols]).factorize(sort=True)
+
+    order = np.lexsort((df[time_col].to_numpy(), codes))
+    starts = np.searchsorted(codes[order], np.arange(len(laps)))
+    return laps, codes, order, starts
+
+
+def segment_last(values, seg_codes, n_segments):
+    """Last value of each segment of values (grouped by the sorted seg_codes), NaN if empty."""
+    out = np.full(n_segments, np.nan)
+    if len(values):
+        last = np.r_[seg_codes[1:] != seg_codes[:-1], True]
+        out[seg_codes[last]] = values[last]
+    return out
+
+
+def segment_min(values, seg_codes, n_segments):
+    """Minimum of each segment of values (grouped by the sorted seg_codes), NaN if empty."""
+    out = np.full(n_segments, np.nan)
+    if len(values):
+        first = np.flatnonzero(np.r_[True, seg_codes[1:] != seg_codes[:-1]])
+        out[seg_codes[first]] = np.fmin.reduceat(values, first)
+    return out
+
+
+def lap_targets(
+    df,
+    corners=None,
+    lap_cols="lap_index",
+    time_col="M_CURRENTLAPTIMEINMS_1",
+    speed_col="M_SPEED_1",
+):
+    """
+    Per-lap and per-corner targets from one ordering of the rows:
+        - exit_speed / min_speed: last and minimum speed of the lap
+        - sector_duration: time (s) between the lap's first and last row, or
+          between its gate crossings (sector_start_ms / sector_end_ms) when the
+          laps were gate sliced
+        - exit_<corner>_speed / min_<corner>_speed: the same over the rows where
+          the corner's boolean mask is set, for each corners entry
+
+    Returns the per-lap dataframe (indexed and ordered by lap key) and each
+    row's lap code, so the targets can be broadcast with broadcast_targets.
+    """
+    laps, codes, order, starts = lap_segments(df, lap_cols, time_col)
+    n_laps = len(laps)
+
+    sorted_codes = codes[order]
+    speed = df[speed_col].to_numpy(dtype=np.float64)[order]
+    time = df[time_col].to_numpy(dtype=np.float64)[order]
+    ends = np.r_[starts[1:], len(order)][:n_laps] - 1
+
+    targets = {
+        "exit_speed": speed[ends],
+        "min_speed": segment_min(speed, sorted_codes, n_laps),
+    }
+
+    # Gate-sliced laps carry their interpolated crossing times (the same on every
+    # row of the lap), which the summary's sector_time also uses
+    if "sector_start_ms" in df.columns and "sector_end_ms" in df.columns:
+        first = order[starts]
+        targets["sector_duration"] = (
+            df["sector_end_ms"].to_numpy(dtype=np.float64)[first]
+            - df["sector_start_ms"].to_numpy(dtype=np.float64)[first]
+        ) / 1000
+    else:
+        targets["sector_duration"] = (time[ends] - time[starts]) / 1000
+
+    for name, mask in (corners or {}).items():
+        rows = np.flatnonzero(np.asarray(mask)[order])
+        targets[f"exit_{name}_speed"] = segment_last(
+            speed[rows], sorted_codes[rows], n_laps
+        )
+        targets[f"min_{name}_speed"] = segment_min(
+            speed[rows], sorted_codes[rows], n_laps
+        )
+
+    index = laps if isinstance(laps, pd.MultiIndex) else pd.Index(laps)
+    index = index.set_names([lap_cols] if isinstance(lap_cols, str) else list(lap_cols))
+    return pd.DataFrame(targets, index=index), codes
+
+
+def broadcast_targets(df, per_lap, codes, columns=None):
+    """Add per-lap target columns to every row of its lap by indexing with the lap codes."""
+    if columns is None:
+        columns = per_lap.columns
+    return df.assign(**{c: per_lap[c].to_numpy()[codes] for c in columns})
+
+
+def corner_windows(df, track=None):
+    """Corner masks T1/T2 from the is_t1_window / is_t2_window turning windows."""
+    return {
+        name.upper(): df[f"is_{name}_window"].to_numpy()
+        for name in get_track(track)["corners"]
+    }
+
+
+def targets(df, summary=None, track=None):
+    """
+    Target stage: computes the lap and corner targets over the turning windows
+    and broadcasts them onto the telemetry rows and the lap summary.
+    """
+    per_lap, codes = lap_targets(df, corners=corner_windows(df, track))
+    df = broadcast_targets(df, per_lap, codes)
+
+    if summary is not None:
+        rows = per_lap.index.get_indexer(summary["lap_index"])
+        summary = broadcast_targets(summary, per_lap, rows)
+
+    logger.info(f"Computed {per_lap.shape[1]} targets for {len(per_lap)} laps.")
+    return df, summary
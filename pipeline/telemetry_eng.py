@@ -1,18 +1,18 @@
 import pandas as pd
 import numpy as np
-from scipy.spatial import cKDTree
 import logging
 from .loading import read_process_line
+from .tracks import get_track
+from .rolling import rolling_features
 
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
-)
 logger = logging.getLogger(__name__)
 
 
-def telemetry_eng(df):
+def telemetry_eng(df, line_path=None, backend="auto", track=None):
+    track = get_track(track)
+
     # Compute turning window metrics.
-    df = compute_turning_window(df)
+    df = compute_turning_window(df, track)
     logger.info("Computed turning window metrics.")
 
     # Interpolates steering angle where possible.
@@ -20,7 +20,7 @@ def telemetry_eng(df):
     logger.info("Interpolating steering data.")
 
     # Load racing line.
-    line = read_process_line()
+    line = read_process_line(line_path, track)
     logger.info("Racing line loaded.")
 
     # Finding deviation from racing line at each point.
@@ -31,14 +31,48 @@ def telemetry_eng(df):
     df = brake_throttle(df)
     logger.info("Created combined brake–throttle variable.")
 
-    # Defines the turning window around each apex (T1 and T2) using distance thresholds.
-    df = compute_turning_window(df)
-    logger.info("Computed turning window around each apex.")
-
     # Computes velocity and g-force.
     df = recompute_velocity_and_gforce(df)
     logger.info("Computed velocity and g-force.")
 
+    # Turning window, steering/slip angles and brake balance for every row.
+    df = geometry_features(df, backend, track)
+
+    # Smoothed inputs, steering variability and brake temperature trends per lap.
+    df = rolling_features(df, backend=backend)
+    logger.info("Computed rolling-window features.")
+
+    return df, line
+
+
+def geometry_features(df, backend="auto", track=None):
+    """
+    Computes the per-row geometry features: the turning window around each apex,
+    the front wheel / car direction / velocity angles and the brake balance.
+
+    backend="numba" runs them all in one compiled, multithreaded loop;
+    backend="numpy" uses the vectorised functions below. "auto" picks numba
+    when it is installed.
+    """
+    from .kernels import NUMBA_AVAILABLE, geometry_features_numba
+
+    if backend == "auto":
+        backend = "numba" if NUMBA_AVAILABLE else "numpy"
+
+    if backend == "numba":
+        if not NUMBA_AVAILABLE:
+            raise ImportError("backend='numba' requires numba to be installed.")
+        df = geometry_features_numba(df, track)
+        logger.info("Computed turning window, angles and brake balance (numba).")
+        return df
+
+    if backend != "numpy":
+        raise ValueError(f"Unknown backend: {backend}")
+
+    # Defines the turning window around each apex (T1 and T2) using distance thresholds.
+    df = compute_turning_window(df, track)
+    logger.info("Computed turning window around each apex.")
+
     # Calculates the angle between the front wheel direction and velocity vector.
     # Helps measure understeer or wheel slip.
     df = front_wheel_vs_velocity(df)
@@ -57,52 +91,30 @@ def telemetry_eng(df):
     df = compute_brake_balance(df)
     logger.info("Computed brake balance.")
 
-    return df, line
+    return df
 
 
-def interpolate_wheel_angle(df):
-    df["M_FRONTWHEELSANGLE"] = (
-        df.groupby(["lap_index"])["M_FRONTWHEELSANGLE"]
+def interpolate_wheel_angle(df, lap_cols="lap_index"):
+    angle = (
+        df.groupby(lap_cols)["M_FRONTWHEELSANGLE"]
         .transform(lambda g: g.interpolate(method="linear"))
         .ffill()
         .bfill()
     )
 
-    return df
-
-
-def compute_turning_window(df):
-    # Apex coordinates
-    t1_apex = (375.57, 191.519)
-    t2_apex = (368.93, 90)
-    turn_radius = 50  # meters
-
-    # Compute distance to each apex
-    df["dist_to_t1_apex"] = np.sqrt(
-        (df["M_WORLDPOSITIONX_1"] - t1_apex[0]) ** 2
-        + (df["M_WORLDPOSITIONY_1"] - t1_apex[1]) ** 2
-    )
-
-    df["dist_to_t2_apex"] = np.sqrt(
-        (df["M_WORLDPOSITIONX_1"] - t2_apex[0]) ** 2
-        + (df["M_WORLDPOSITIONY_1"] - t2_apex[1]) ** 2
-    )
-
-    # Binary columns indicating if point is inside turning window
-    df["is_t1_window"] = df["dist_to_t1_apex"] <= turn_radius
-    df["is_t2_window"] = df["dist_to_t2_apex"] <= turn_radius
-    return df
+    return df.assign(M_FRONTWHEELSANGLE=angle)
 
 
 def racing_line_deviation(df, line):
+    from scipy.spatial import cKDTree
+
     line_points = line[["WORLDPOSX", "WORLDPOSY"]].to_numpy()
     tree = cKDTree(line_points)
 
     driver_points = df[["M_WORLDPOSITIONX_1", "M_WORLDPOSITIONY_1"]].to_numpy()
     distances, _ = tree.query(driver_points)
 
-    df["line_distance"] = distances
-    return df
+    return df.assign(line_distance=distances)
 
 
 def brake_throttle(df):
@@ -110,38 +122,40 @@ def brake_throttle(df):
     Creating a feature that combines the driver's throttle and brake input into
     one variable for convenient visualisation.
     """
-    df["M_BRAKE_THROTTLE_1"] = df["M_THROTTLE_1"] - df["M_BRAKE_1"]
-
-    return df
+    return df.assign(M_BRAKE_THROTTLE_1=df["M_THROTTLE_1"] - df["M_BRAKE_1"])
 
 
-def compute_turning_window(df):
+def compute_turning_window(df, track=None):
     """
     Defines the *turning window* around each apex (T1 and T2) based on distance thresholds.
 
     This function computes the car's distance from each turn apex and creates binary flags
     that indicate whether the car is within the "turning zone" (a circular region around the apex).
     """
-    # Apex coordinates
-    t1_apex = (375.57, 191.519)
-    t2_apex = (368.93, 90)
-    turn_radius = 50  # meters
+    # Apex coordinates of the track's two corners
+    track = get_track(track)
+    t1_apex = track["corners"]["t1"]
+    t2_apex = track["corners"]["t2"]
+    turn_radius = track["turn_radius"]  # meters
 
     # Compute distance to each apex
-    df["dist_to_t1_apex"] = np.sqrt(
+    dist_to_t1_apex = np.sqrt(
         (df["M_WORLDPOSITIONX_1"] - t1_apex[0]) ** 2
         + (df["M_WORLDPOSITIONY_1"] - t1_apex[1]) ** 2
     )
 
-    df["dist_to_t2_apex"] = np.sqrt(
+    dist_to_t2_apex = np.sqrt(
         (df["M_WORLDPOSITIONX_1"] - t2_apex[0]) ** 2
         + (df["M_WORLDPOSITIONY_1"] - t2_apex[1]) ** 2
     )
 
     # Binary columns indicating if point is inside turning window
-    df["is_t1_window"] = df["dist_to_t1_apex"] <= turn_radius
-    df["is_t2_window"] = df["dist_to_t2_apex"] <= turn_radius
-    return df
+    return df.assign(
+        dist_to_t1_apex=dist_to_t1_apex,
+        dist_to_t2_apex=dist_to_t2_apex,
+        is_t1_window=dist_to_t1_apex <= turn_radius,
+        is_t2_window=dist_to_t2_apex <= turn_radius,
+    )
 
 
 def front_wheel_vs_velocity(df):
@@ -184,13 +198,11 @@ def front_wheel_vs_velocity(df):
         dot[valid_mask] / (norm_fw[valid_mask] * norm_vel[valid_mask]), -1, 1
     )
 
-    df["angle_fw_vs_vel"] = np.full(len(df), np.nan)
-    df.loc[valid_mask, "angle_fw_vs_vel"] = np.rad2deg(np.arccos(cos_theta[valid_mask]))
+    angle = np.full(len(df), np.nan)
+    angle[valid_mask] = np.rad2deg(np.arccos(cos_theta[valid_mask]))
 
     # Correct to get deviation (e.g., 180° → 0°)
-    df["angle_fw_vs_vel"] = 180 - df["angle_fw_vs_vel"]
-
-    return df
+    return df.assign(angle_fw_vs_vel=180 - angle)
 
 
 def car_direction_vs_velocity(df):
@@ -222,15 +234,11 @@ def car_direction_vs_velocity(df):
         dot[valid_mask] / (norm_forward[valid_mask] * norm_vel[valid_mask]), -1, 1
     )
 
-    df["angle_car_vs_vel"] = np.full(len(df), np.nan)
-    df.loc[valid_mask, "angle_car_vs_vel"] = np.rad2deg(
-        np.arccos(cos_theta[valid_mask])
-    )
+    angle = np.full(len(df), np.nan)
+    angle[valid_mask] = np.rad2deg(np.arccos(cos_theta[valid_mask]))
 
     # Correct to get deviation (e.g., 180° → 0°)
-    df["angle_car_vs_vel"] = 180 - df["angle_car_vs_vel"]
-
-    return df
+    return df.assign(angle_car_vs_vel=180 - angle)
 
 
 def front_wheel_vs_car_direction(df):
@@ -262,89 +270,26 @@ def front_wheel_vs_car_direction(df):
     norm_forward = np.linalg.norm(car_forward, axis=1)
     cos_theta = np.clip(dot / (norm_fw * norm_forward), -1, 1)
 
-    df["angle_fw_vs_car"] = np.rad2deg(np.arccos(cos_theta))
+    angle = np.rad2deg(np.arccos(cos_theta))
 
     # Small correction to keep everything within 0–90 range
-    df["angle_fw_vs_car"] = np.where(
-        df["angle_fw_vs_car"] > 90, 180 - df["angle_fw_vs_car"], df["angle_fw_vs_car"]
-    )
-
-    return df
-
-
-def recompute_velocity_and_gforce(df):
-    """
-    Recomputes directional velocity and G-force features from positional data and timestamps.
-    Handles missing values, clips unrealistic outliers, and applies interpolation smoothing.
-    Also smooths front wheel angle readings.
-
-    Steps:
-    1. Drops existing velocity and G-force columns (to fully recompute them).
-    2. Recomputes velocity (m/s) per lap using position deltas over time.
-    3. Recomputes acceleration and converts to G-force.
-    4. Clips unrealistic values (>7 Gs or >100 m/s) and interpolates within laps.
-    """
-
-    # Drop old velocity and G-force columns
-    df = df.drop(
-        columns=[
-            "M_WORLDVELOCITYX_1",
-            "M_WORLDVELOCITYY_1",
-            "M_WORLDVELOCITYZ_1",
-            "M_GFORCELATERAL_1",
-            "M_GFORCELONGITUDINAL_1",
-            "M_GFORCEVERTICAL_1",
-        ],
-        errors="ignore",  # In case some columns are missing
-    )
-
-    # --- Velocity ---
-    for axis in ["X", "Y", "Z"]:
-        df[f"VEL_{axis}"] = (
-            df.groupby("lap_index")[f"M_WORLDPOSITION{axis}_1"].diff()
-            / df.groupby("lap_index")["M_CURRENTLAPTIMEINMS_1"].diff()
-        )
-        df[f"VEL_{axis}"] *= 1000  # Convert to m/s
-        df[f"VEL_{axis}"] = df[f"VEL_{axis}"].fillna(0)
-
-    # Clip extreme velocity outliers (~100 m/s max for F1 car)
-    df["VEL_X"] = df["VEL_X"].clip(-100, 100)
-    df["VEL_Y"] = df["VEL_Y"].clip(-100, 100)
-    df["VEL_Z"] = df["VEL_Z"].clip(-100, 100)
-
-    # --- G-force ---
-    for axis in ["X", "Y", "Z"]:
-        df[f"GFORCE_{axis}"] = (
-            df.groupby("lap_index")[f"VEL_{axis}"].diff()
-            / df.groupby("lap_index")["M_CURRENTLAPTIMEINMS_1"].diff()
-        )
-        df[f"GFORCE_{axis}"] *= 1000  # Convert to m/s²
-        df[f"GFORCE_{axis}"] /= 9.8  # Convert to Gs
-        df[f"GFORCE_{axis}"] = df[f"GFORCE_{axis}"].fillna(0)
-
-        # Mask unrealistic extremes (>7 Gs)
-        df.loc[
-            (df[f"GFORCE_{axis}"] > 7) | (df[f"GFORCE_{axis}"] < -7),
-            f"GFORCE_{axis}",
-        ] = np.nan
-
-        # Interpolate linearly per lap and fill remaining NaNs
-        df[f"GFORCE_{axis}"] = df.groupby("lap_index")[f"GFORCE_{axis}"].transform(
-            lambda g: g.interpolate(method="linear").ffill().bfill()
-        )
-
-    return df
+    return df.assign(angle_fw_vs_car=np.where(angle > 90, 180 - angle, angle))
 
 
-def recompute_velocity_and_gforce(df: pd.DataFrame) -> pd.DataFrame:
+def recompute_velocity_and_gforce(
+    df: pd.DataFrame, lap_cols="lap_index"
+) -> pd.DataFrame:
     """
     Recomputes directional velocity and G-force features from positional data
     and timestamps, handles missing values, clips unrealistic outliers, and
     applies interpolation. Also smooths front wheel angle readings.
-    """
 
-    df = df.copy()
+    lap_cols identifies a lap (the EDA path uses session and lap number).
 
+    Rows should be at most one per frame (cleaning.repair_frames), otherwise zero
+    time deltas make every rate after a duplicate infinite. The ±7 G mask and its
+    per-lap interpolation only run for axes with values to mask.
+    """
     # Drop any existing velocity / G-force columns
     drop_cols = [
         "M_WORLDVELOCITYX_1",
@@ -354,39 +299,35 @@ def recompute_velocity_and_gforce(df: pd.DataFrame) -> pd.DataFrame:
         "M_GFORCELONGITUDINAL_1",
         "M_GFORCEVERTICAL_1",
     ]
-    df = df.drop(columns=[c for c in drop_cols if c in df.columns], errors="ignore")
+
+    lap = df.groupby(lap_cols, sort=False).ngroup()
+    dt = df["M_CURRENTLAPTIMEINMS_1"].groupby(lap).diff()
+    new = {}
 
     # --- Velocity computation ---
     for axis in ["X", "Y", "Z"]:
-        df[f"VEL_{axis}"] = (
-            df.groupby("lap_index")[f"M_WORLDPOSITION{axis}_1"].diff()
-            / df.groupby("lap_index")["M_CURRENTLAPTIMEINMS_1"].diff()
-        )
-        df[f"VEL_{axis}"] *= 1000  # convert from ms to s
-        df[f"VEL_{axis}"] = df[f"VEL_{axis}"].fillna(0)
-        df[f"VEL_{axis}"] = df[f"VEL_{axis}"].clip(-100, 100)
+        vel = df[f"M_WORLDPOSITION{axis}_1"].groupby(lap).diff() / dt
+        vel *= 1000  # convert from ms to s
+        new[f"VEL_{axis}"] = vel.fillna(0).clip(-100, 100)
 
     # --- G-force computation ---
     for axis in ["X", "Y", "Z"]:
-        df[f"GFORCE_{axis}"] = (
-            df.groupby("lap_index")[f"VEL_{axis}"].diff()
-            / df.groupby("lap_index")["M_CURRENTLAPTIMEINMS_1"].diff()
-        )
-        df[f"GFORCE_{axis}"] *= 1000  # convert from ms to s
-        df[f"GFORCE_{axis}"] /= 9.8  # convert to Gs
-        df[f"GFORCE_{axis}"] = df[f"GFORCE_{axis}"].fillna(0)
-
-        # Mask unrealistic extremes (outside ±7 Gs)
-        df.loc[
-            (df[f"GFORCE_{axis}"] > 7) | (df[f"GFORCE_{axis}"] < -7), f"GFORCE_{axis}"
-        ] = np.nan
-
-        # Interpolate per lap
-        df[f"GFORCE_{axis}"] = df.groupby("lap_index")[f"GFORCE_{axis}"].transform(
-            lambda g: g.interpolate(method="linear").ffill().bfill()
-        )
+        gforce = new[f"VEL_{axis}"].groupby(lap).diff() / dt
+        gforce *= 1000  # convert from ms to s
+        gforce /= 9.8  # convert to Gs
+        gforce = gforce.fillna(0)
 
-    return df
+        # Mask unrealistic extremes (outside ±7 Gs) and interpolate per lap
+        extreme = (gforce > 7) | (gforce < -7)
+        if extreme.any():
+            gforce = (
+                gforce.mask(extreme)
+                .groupby(lap)
+                .transform(lambda g: g.interpolate(method="linear").ffill().bfill())
+            )
+        new[f"GFORCE_{axis}"] = gforce
+
+    return df.drop(columns=[c for c in drop_cols if c in df.columns]).assign(**new)
 
 
 def compute_brake_balance(df):
@@ -401,31 +342,13 @@ def compute_brake_balance(df):
             (often due to more right-hand cornering or uneven braking effort).
     """
     # Front vs rear average
-    df["brake_front_avg"] = (
-        df["M_BRAKESTEMPERATURE_FL_1"] + df["M_BRAKESTEMPERATURE_FR_1"]
-    ) / 2
-    df["brake_rear_avg"] = (
-        df["M_BRAKESTEMPERATURE_RL_1"] + df["M_BRAKESTEMPERATURE_RR_1"]
-    ) / 2
-    df["brake_front_rear_diff"] = df["brake_front_avg"] - df["brake_rear_avg"]
+    front = (df["M_BRAKESTEMPERATURE_FL_1"] + df["M_BRAKESTEMPERATURE_FR_1"]) / 2
+    rear = (df["M_BRAKESTEMPERATURE_RL_1"] + df["M_BRAKESTEMPERATURE_RR_1"]) / 2
 
     # Left vs right average
-    df["brake_left_avg"] = (
-        df["M_BRAKESTEMPERATURE_FL_1"] + df["M_BRAKESTEMPERATURE_RL_1"]
-    ) / 2
-    df["brake_right_avg"] = (
-        df["M_BRAKESTEMPERATURE_FR_1"] + df["M_BRAKESTEMPERATURE_RR_1"]
-    ) / 2
-    df["brake_left_right_diff"] = df["brake_left_avg"] - df["brake_right_avg"]
-
-    df.drop(
-        columns=[
-            "brake_front_avg",
-            "brake_rear_avg",
-            "brake_left_avg",
-            "brake_right_avg",
-        ],
-        inplace=True,
-    )
+    left = (df["M_BRAKESTEMPERATURE_FL_1"] + df["M_BRAKESTEMPERATURE_RL_1"]) / 2
+    right = (df["M_BRAKESTEMPERATURE_FR_1"] + df["M_BRAKESTEMPERATURE_RR_1"]) / 2
 
-    return df
+    return df.assign(
+        brake_front_rear_diff=front - rear, brake_left_right_diff=left - right
+    )
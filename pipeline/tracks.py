@@ -0,0 +1,73 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# M_TRACKID of Albert Park, the default track of the pipeline
+MELBOURNE = 0
+
+# Track registry: M_TRACKID -> everything the stages need to know about a circuit.
+#   name: short name, used for per-track output directories
+#   left / right / line: default reference CSVs (track limits and racing line)
+#   reference_bounds: (xmin, xmax, ymin, ymax) kept from the reference files
+#   slice_bounds / slice_polygon: bounding box and polygon enclosing the sector
+#   start_gate / end_gate: right-boundary anchors of the sector cut lines
+#   corners: apex coordinates of the sector's two corners, t1 and t2
+#   turn_radius: radius (m) of the turning window around each apex
+TRACKS = {
+    MELBOURNE: {
+        "name": "albert_park",
+        "left": "data/f1sim-ref-left.csv",
+        "right": "data/f1sim-ref-right.csv",
+        "line": "data/f1sim-ref-line.csv",
+        "reference_bounds": (120, 600, -200, 600),
+        "slice_bounds": (0, 600, -200, 600),
+        "slice_polygon": [
+            [152.5310179012927, 413.5544859306186],
+            [161.76398481864388, 423.11538718965284],
+            [572, 423],
+            [572.051098447852, -131.86683911251717],
+            [564.8183173166642, -138.23284559314058],
+            [152, -138],
+        ],
+        "start_gate": (152.5310179012927, 413.5544859306186),
+        "end_gate": (564.8183173166642, -138.23284559314058),
+        "corners": {"t1": (375.57, 191.519), "t2": (368.93, 90.0)},
+        "turn_radius": 50,
+    }
+}
+
+TRACK_KEYS = list(TRACKS[MELBOURNE])
+
+
+def register_track(track_id, **config):
+    """
+    Add (or replace) a track in the registry. Every key of the Albert Park entry
+    must be given, e.g.
+
+    register_track(3, name="bahrain", left="data/bahrain-left.csv", ...)
+    """
+    missing = [key for key in TRACK_KEYS if key not in config]
+    if missing:
+        raise ValueError(f"Track {track_id} is missing {missing}")
+    if set(config["corners"]) != {"t1", "t2"}:
+        raise ValueError("corners must give the t1 and t2 apex coordinates")
+
+    TRACKS[int(track_id)] = config
+    logger.info(f"Registered track {track_id} ({config['name']}).")
+    return config
+
+
+def get_track(track=None):
+    """
+    Resolve a track id (or an already resolved config) to its registry entry.
+    None is Albert Park.
+    """
+    if track is None:
+        track = MELBOURNE
+    if isinstance(track, dict):
+        return track
+    if int(track) not in TRACKS:
+        raise KeyError(
+            f"Track {track} is not registered, known tracks: {sorted(TRACKS)}"
+        )
+    return TRACKS[int(track)]
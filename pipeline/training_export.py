@@ -0,0 +1,184 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+import logging
+from .column_store import MANIFEST
+from .resampling import resample_laps
+from .tracks import get_track
+
+logger = logging.getLogger(__name__)
+
+# Lap summary columns used as per-lap scalar features (targets are left out)
+SCALAR_FEATURES = [
+    "sector_time",
+    "avg_line_distance",
+    "dist_to_apex1",
+    "dist_to_apex2",
+    "avg_brake_pressure",
+    "avg_throttle_pressure",
+    "peak_brake_pressure",
+    "peak_throttle_pressure",
+    "brake_x",
+    "brake_y",
+    "brake_pressure",
+    "turn_x",
+    "turn_y",
+    "steering_angle",
+]
+
+WINDOW_CHANNELS = ["M_SPEED_1", "M_BRAKE_1", "M_THROTTLE_1", "M_STEER_1", "M_GEAR_1"]
+
+FILES = {
+    "lap_index": "lap_index.npy",
+    "session": "session.npy",
+    "scalars": "scalars.npy",
+    "windows": "windows.npy",
+    "target": "target.npy",
+}
+
+
+def apex_lap_distance(df, corner, distance_col="M_LAPDISTANCE_1"):
+    """Lap distance of each lap's closest approach to the corner apex, indexed by lap_index."""
+    nearest = df.groupby("lap_index")[f"dist_to_{corner}_apex"].idxmin()
+    return pd.Series(df.loc[nearest, distance_col].to_numpy(), index=nearest.index)
+
+
+def session_split(sessions, val_fraction=0.2, seed=0):
+    """Pick whole sessions for validation so no session appears in both splits."""
+    unique = np.unique(sessions)
+    n_val = int(round(len(unique) * val_fraction))
+    if val_fraction > 0 and len(unique) > 1:
+        n_val = min(max(n_val, 1), len(unique) - 1)
+    val_sessions = np.random.default_rng(seed).permutation(unique)[:n_val]
+    return np.isin(sessions, val_sessions), np.sort(val_sessions)
+
+
+def export_training_matrix(
+    df,
+    summary,
+    path,
+    target="exit_T2_speed",
+    scalar_features=None,
+    channels=None,
+    window=(-100.0, 50.0),
+    step=1.0,
+    val_fraction=0.2,
+    seed=0,
+    track=None,
+    dtype=np.float32,
+):
+    """
+    Writes fixed-shape model inputs for every lap with a target as .npy files
+    that training jobs can memory-map:
+        - scalars: (laps, features) per-lap summary features
+        - windows: (laps, corners, stations, channels) channels resampled on a
+          distance grid from window[0] to window[1] metres around each corner's
+          apex, NaN where the lap was not recorded
+        - target, lap_index, session: one value per lap
+
+    Laps are split by session into train and validation and written train first,
+    so each split is a contiguous slice of every array (see load_training_matrix).
+    The manifest records the feature, corner, channel and station layout.
+    """
+    if scalar_features is None:
+        scalar_features = [c for c in SCALAR_FEATURES if c in summary.columns]
+    if channels is None:
+        channels = WINDOW_CHANNELS
+    if target not in summary.columns:
+        raise KeyError(f"{target} not in the summary; run the targets stage first.")
+
+    summary = summary[summary[target].notna()]
+    sessions = df.groupby("lap_index")["M_SESSIONUID"].first()
+    sessions = sessions.reindex(summary["lap_index"]).to_numpy()
+
+    is_val, val_sessions = session_split(sessions, val_fraction, seed)
+    # Train laps first, each split keeping lap order
+    lap_order = np.argsort(is_val, kind="stable")
+    summary = summary.iloc[lap_order]
+    laps = summary["lap_index"].to_numpy()
+    n_laps, n_train = len(laps), int((~is_val).sum())
+
+    os.makedirs(path, exist_ok=True)
+
+    def open_array(name, shape, array_dtype=dtype):
+        return np.lib.format.open_memmap(
+            os.path.join(path, FILES[name]), mode="w+", dtype=array_dtype, shape=shape
+        )
+
+    open_array("lap_index", (n_laps,), laps.dtype)[:] = laps
+    open_array("session", (n_laps,), sessions.dtype)[:] = sessions[lap_order]
+    open_array("target", (n_laps,))[:] = summary[target].to_numpy()
+    open_array("scalars", (n_laps, len(scalar_features)))[:] = summary[
+        scalar_features
+    ].to_numpy(dtype=np.float64)
+
+    corners = list(get_track(track)["corners"])
+    stations = np.arange(window[0], window[1] + step / 2, step)
+    windows = open_array(
+        "windows", (n_laps, len(corners), len(stations), len(channels))
+    )
+    lap_rows = df[df["lap_index"].isin(laps)]
+    for k, corner in enumerate(corners):
+        resampled, _, cube = resample_laps(
+            lap_rows,
+            channels,
+            step=step,
+            start=stations[0],
+            stop=stations[-1],
+            origin=apex_lap_distance(lap_rows, corner),
+            dtype=dtype,
+        )
+        windows[:, k] = np.nan
+        rows = pd.Index(resampled).get_indexer(laps)
+        windows[rows >= 0, k] = cube[rows[rows >= 0]]
+    windows.flush()
+
+    manifest = {
+        "n_laps": n_laps,
+        "target": target,
+        "scalar_features": list(scalar_features),
+        "corners": [c.upper() for c in corners],
+        "channels": list(channels),
+        "stations": stations.tolist(),
+        "splits": {"train": [0, n_train], "val": [n_train, n_laps]},
+        "val_sessions": val_sessions.tolist(),
+        "files": FILES,
+    }
+    with open(os.path.join(path, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    logger.info(
+        f"Exported {n_laps} laps ({n_train} train, {n_laps - n_train} validation) to {path}."
+    )
+    return manifest
+
+
+def load_training_matrix(path, split=None):
+    """
+    Memory-maps an exported training matrix. With split ("train" or "val") every
+    array is sliced to that split's laps, still without copying.
+
+    Returns (arrays, manifest) where arrays maps the FILES names to read-only memmaps.
+    """
+    with open(os.path.join(path, MANIFEST)) as f:
+        manifest = json.load(f)
+
+    arrays = {
+        name: np.load(os.path.join(path, file), mmap_mode="r")
+        for name, file in manifest["files"].items()
+    }
+    if split is not None:
+        start, stop = manifest["splits"][split]
+        arrays = {name: values[start:stop] for name, values in arrays.items()}
+    return arrays, manifest
+
+
+def iter_batches(path, split="train", batch_size=256):
+    """Yield consecutive batches of a split as dicts of memmap slices."""
+    arrays, _ = load_training_matrix(path, split)
+    n_laps = len(arrays["target"])
+    for start in range(0, n_laps, batch_size):
+        yield {
+            name: values[start : start + batch_size] for name, values in arrays.items()
+        }
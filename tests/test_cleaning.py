@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+from pipeline.cleaning import frame_spacing_mask, repair_frames
+
+
+def lap_frame(times, lap=0):
+    return pd.DataFrame(
+        {
+            "lap_index": lap,
+            "M_CURRENTLAPTIMEINMS_1": times,
+            "M_WORLDPOSITIONX_1": np.arange(len(times), dtype=float),
+            "M_WORLDPOSITIONY_1": 0.0,
+        }
+    )
+
+
+def test_close_rows_are_measured_from_the_previous_kept_row():
+    df = lap_frame([0, 3, 6, 30, 60])
+    kept = repair_frames(df, min_frame_ms=5)
+    assert kept["M_CURRENTLAPTIMEINMS_1"].tolist() == [0, 6, 30, 60]
+
+
+def test_spacing_matches_a_sequential_scan():
+    rng = np.random.default_rng(0)
+    lap = np.repeat(np.arange(50), 40)
+    time = np.concatenate([np.cumsum(rng.integers(1, 12, 40)) for _ in range(50)])
+    shuffled = rng.permutation(len(lap))
+    lap, time = lap[shuffled], time[shuffled]
+
+    expected = np.zeros(len(lap), dtype=bool)
+    last = {}
+    for i in np.lexsort((time, lap)):
+        if lap[i] not in last or time[i] >= last[lap[i]] + 5:
+            expected[i] = True
+            last[lap[i]] = time[i]
+
+    assert np.array_equal(frame_spacing_mask(lap, time, 5), expected)
+
+
+def test_rewound_rows_are_dropped():
+    df = lap_frame([0, 16, 33, 50, 66, 40, 56, 72])
+    kept = repair_frames(df)
+    assert kept["M_CURRENTLAPTIMEINMS_1"].tolist() == [0, 16, 33, 40, 56, 72]
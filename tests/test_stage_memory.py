@@ -0,0 +1,117 @@
+from functools import partial
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.stage_memory import stage_report
+from pipeline.cleaning import re_index
+from pipeline.kernels import GEOMETRY_OUTPUTS
+from pipeline.pipeline import copy_on_write
+from pipeline.rolling import rolling_features
+from pipeline.telemetry_eng import (
+    brake_throttle,
+    compute_turning_window,
+    geometry_features,
+    interpolate_wheel_angle,
+    racing_line_deviation,
+    recompute_velocity_and_gforce,
+)
+
+# A step may hold at most this multiple of its input frame in memory at once
+MAX_PEAK_RATIO = 3
+
+
+def synthetic_laps(n_laps=40, n_rows=2500, seed=0):
+    """Telemetry-shaped frame of n_laps laps driven around a circle."""
+    rng = np.random.default_rng(seed)
+    n = n_laps * n_rows
+    theta = np.tile(np.linspace(0, 2 * np.pi, n_rows), n_laps)
+    wheel = rng.normal(0, 5, n)
+    wheel[rng.random(n) < 0.01] = np.nan
+    return pd.DataFrame(
+        {
+            "M_SESSIONUID": np.repeat(rng.integers(1, 4, n_laps), n_rows),
+            "M_CURRENTLAPNUM": np.repeat(np.arange(n_laps), n_rows),
+            "lap_index": np.repeat(np.arange(n_laps), n_rows),
+            "M_CURRENTLAPTIMEINMS_1": np.tile(np.arange(n_rows) * 16.0, n_laps),
+            "M_WORLDPOSITIONX_1": 370 + 100 * np.cos(theta) + rng.normal(0, 0.5, n),
+            "M_WORLDPOSITIONY_1": 140 + 100 * np.sin(theta) + rng.normal(0, 0.5, n),
+            "M_WORLDPOSITIONZ_1": rng.normal(0, 0.1, n),
+            "M_WORLDFORWARDDIRX_1": -np.sin(theta),
+            "M_WORLDFORWARDDIRY_1": np.cos(theta),
+            "M_FRONTWHEELSANGLE": wheel,
+            "M_SPEED_1": rng.uniform(80, 300, n),
+            "M_BRAKE_1": rng.uniform(0, 1, n),
+            "M_THROTTLE_1": rng.uniform(0, 1, n),
+            "M_STEER_1": rng.uniform(-1, 1, n),
+            **{
+                f"M_BRAKESTEMPERATURE_{w}_1": rng.uniform(300, 900, n)
+                for w in ["FL", "FR", "RL", "RR"]
+            },
+        }
+    )
+
+
+def racing_line():
+    theta = np.linspace(0, 2 * np.pi, 500)
+    return pd.DataFrame(
+        {
+            "FRAME": np.arange(500),
+            "WORLDPOSX": 370 + 100 * np.cos(theta),
+            "WORLDPOSY": 140 + 100 * np.sin(theta),
+        }
+    )
+
+
+# (step, columns it rewrites in place of the input's), applied in pipeline order
+STEPS = [
+    (re_index, []),
+    (compute_turning_window, []),
+    (interpolate_wheel_angle, ["M_FRONTWHEELSANGLE"]),
+    (partial(racing_line_deviation, line=racing_line()), []),
+    (brake_throttle, []),
+    (recompute_velocity_and_gforce, []),
+    (partial(geometry_features, backend="numpy"), GEOMETRY_OUTPUTS),
+    (partial(rolling_features, backend="numpy"), []),
+]
+
+
+@pytest.fixture(scope="module")
+def reports():
+    df = synthetic_laps().drop(columns="lap_index")
+    reports = []
+    with copy_on_write():
+        for step, rewrites in STEPS:
+            df, report = stage_report(step, df)
+            reports.append((getattr(step, "func", step).__name__, rewrites, report))
+    return reports
+
+
+@pytest.mark.parametrize("position", range(len(STEPS)))
+def test_step_shares_unchanged_columns(reports, position):
+    name, rewrites, report = reports[position]
+    assert not report["mutated"], f"{name} changed its input"
+    assert set(report["copied"]) <= set(rewrites), f"{name} copied {report['copied']}"
+
+
+@pytest.mark.parametrize("position", range(len(STEPS)))
+def test_step_peak_memory(reports, position):
+    name, _, report = reports[position]
+    assert (
+        report["peak"] <= MAX_PEAK_RATIO * report["input_bytes"]
+    ), f"{name} peaked at {report['peak'] / report['input_bytes']:.1f}x its input"
+
+
+def test_report_catches_a_copy_and_a_mutation():
+    df = synthetic_laps(n_laps=2, n_rows=100)
+
+    def copies(df):
+        return df.assign(M_SPEED_1=df["M_SPEED_1"].copy())
+
+    def mutates(df):
+        df["M_SPEED_1"] = 0.0
+        return df
+
+    assert stage_report(copies, df)[1]["copied"] == ["M_SPEED_1"]
+    assert stage_report(mutates, df.copy())[1]["mutated"]
@@ -1,6 +1,10 @@
 import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
+from pipeline.targets import lap_targets, broadcast_targets
+from pipeline.telemetry_eng import (
+    recompute_velocity_and_gforce,
+    interpolate_wheel_angle,
+)
 
 """
 Steps:
@@ -24,6 +28,8 @@ def preprocess_f1_data(f1_main_df):
     def plot_track_rotated(
         df, x_col="M_WORLDPOSITIONX_1", y_col="M_WORLDPOSITIONY_1", angle_deg=0
     ):
+        import matplotlib.pyplot as plt
+
         # Convert angle to radians
         theta = np.radians(angle_deg)
 
@@ -82,97 +88,26 @@ def preprocess_f1_data(f1_main_df):
     )
 
     """
-    TARGET VARIABLE: Creates a target variable (exit_T2_speed) by capturing the last recorded speed 
-    after Turn 2 for each session-lap combination, then merges it back into the main dataframe.
+    TARGET VARIABLE: Creates a target variable (exit_T2_speed) from the last recorded speed
+    in Turn 2 for each session-lap combination, broadcast back onto the rows of the lap.
     """
-    ## Add exit speed of Turn 2 as target variable
-    t2_df = melbourne_df[melbourne_df["TURN"] == 2]
-
-    # For each session + lap combo, take the exit speed of T2
-    exit_t2 = (
-        t2_df.groupby(["M_SESSIONUID", "M_CURRENTLAPNUM"])["M_SPEED_1"]
-        .last()
-        .reset_index(name="exit_T2_speed")
-    )
-
-    melbourne_df = melbourne_df.merge(
-        exit_t2, on=["M_SESSIONUID", "M_CURRENTLAPNUM"], how="left"
+    lap_cols = ["M_SESSIONUID", "M_CURRENTLAPNUM"]
+    # Rows without a speed are left out, as groupby().last() skips missing values
+    t2_rows = (melbourne_df["TURN"] == 2) & melbourne_df["M_SPEED_1"].notna()
+    per_lap, codes = lap_targets(
+        melbourne_df, corners={"T2": t2_rows}, lap_cols=lap_cols
     )
+    melbourne_df = broadcast_targets(
+        melbourne_df, per_lap, codes, columns=["exit_T2_speed"]
+    ).reset_index(drop=True)
 
     """
     MISSING VALUES: Recomputes directional velocity and G-force features from positional data 
     and timestamps, handles missing values, clips unrealistic outliers, and applies interpolation. 
     Also smooths front wheel angle readings.
     """
-    # Remake all velocity and G-force columns in m/s
-    melbourne_df = melbourne_df.drop(
-        columns=[
-            "M_WORLDVELOCITYX_1",
-            "M_WORLDVELOCITYY_1",
-            "M_WORLDVELOCITYZ_1",
-            "M_GFORCELATERAL_1",
-            "M_GFORCELONGITUDINAL_1",
-            "M_GFORCEVERTICAL_1",
-        ]
-    )
-
-    # Velocity
-    for axis in ["X", "Y", "Z"]:
-        melbourne_df[f"VEL_{axis}"] = (
-            melbourne_df.groupby(["M_SESSIONUID", "M_CURRENTLAPNUM"])[
-                f"M_WORLDPOSITION{axis}_1"
-            ].diff()
-            / melbourne_df.groupby(["M_SESSIONUID", "M_CURRENTLAPNUM"])[
-                "M_CURRENTLAPTIMEINMS_1"
-            ].diff()
-        )
-        melbourne_df[f"VEL_{axis}"] *= 1000
-        # Replace every first row NaN (each lap per session) with zero
-        melbourne_df[f"VEL_{axis}"] = melbourne_df[f"VEL_{axis}"].fillna(0)
-
-    # Clip X,Y,Z velocities extreme outliers (~100m/s is realistic top velocity of an F1 car for THIS data)
-    melbourne_df["VEL_X"] = melbourne_df["VEL_X"].clip(-100, 100)
-    melbourne_df["VEL_Y"] = melbourne_df["VEL_Y"].clip(-100, 100)
-    melbourne_df["VEL_Z"] = melbourne_df["VEL_Z"].clip(-100, 100)
-
-    # G-force
-    for axis in ["X", "Y", "Z"]:
-        # Acceleration
-        melbourne_df[f"GFORCE_{axis}"] = (
-            melbourne_df.groupby(["M_SESSIONUID", "M_CURRENTLAPNUM"])[
-                f"VEL_{axis}"
-            ].diff()
-            / melbourne_df.groupby(["M_SESSIONUID", "M_CURRENTLAPNUM"])[
-                "M_CURRENTLAPTIMEINMS_1"
-            ].diff()
-        )
-        melbourne_df[f"GFORCE_{axis}"] *= 1000
-        # Convert to Gs
-        melbourne_df[f"GFORCE_{axis}"] /= 9.8
-        # Replace everry first row NaN with zero
-        melbourne_df[f"GFORCE_{axis}"] = melbourne_df[f"GFORCE_{axis}"].fillna(0)
-
-        # Mask unrealistic extremes (Outside of 7Gs)
-        melbourne_df.loc[
-            (melbourne_df[f"GFORCE_{axis}"] > 7)
-            | (melbourne_df[f"GFORCE_{axis}"] < -7),
-            f"GFORCE_{axis}",
-        ] = np.nan
-        # Interpolate linearly per session/lap
-        melbourne_df[f"GFORCE_{axis}"] = (
-            melbourne_df.groupby(["M_SESSIONUID", "M_CURRENTLAPNUM"])[f"GFORCE_{axis}"]
-            .transform(lambda g: g.interpolate(method="linear"))
-            .ffill()
-            .bfill()
-        )
-
-    # Linear interpolation for the front wheels angle
-    melbourne_df["M_FRONTWHEELSANGLE"] = (
-        melbourne_df.groupby(["M_SESSIONUID", "M_CURRENTLAPNUM"])["M_FRONTWHEELSANGLE"]
-        .transform(lambda g: g.interpolate(method="linear"))
-        .ffill()
-        .bfill()
-    )
+    melbourne_df = recompute_velocity_and_gforce(melbourne_df, lap_cols)
+    melbourne_df = interpolate_wheel_angle(melbourne_df, lap_cols)
 
     """
     REDUNDANT VARIABLES: Removes session metadata, duplicates, and irrelevant columns that are either 
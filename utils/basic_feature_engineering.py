@@ -11,12 +11,12 @@ def optimize_target_variable(df):
 
     Example Usage: f1_cleaned_df = optimize_target_variable(f1_cleaned_df)
     """
-    optdf = df[
+    optdf = df.loc[
         df["exit_T2_speed"] >= 175
     ]  # Clear outliers (invalid or non consequential speed)
-    optdf["exit_T2_speed_log"] = np.log(
-        optdf["exit_T2_speed"]
-    )  # Reduce target variable imbalance
+    optdf = optdf.assign(
+        exit_T2_speed_log=np.log(optdf["exit_T2_speed"])
+    )  # Reduce target variable imbalance, as a new frame rather than a slice write
     return optdf
 
 
@@ -1,10 +1,29 @@
 import pandas as pd 
-import matplotlib.pyplot as plt
 import numpy as np
 
-f1_left_limit = pd.read_csv("f1sim-ref-left.csv")
-f1_right_limit = pd.read_csv("f1sim-ref-right.csv")
-f1_turns_limit = pd.read_csv("f1sim-ref-turns.csv")
+# Reference files behind f1_left_limit, f1_right_limit and f1_turns_limit
+REFERENCE_FILES = {
+    "f1_left_limit": "f1sim-ref-left.csv",
+    "f1_right_limit": "f1sim-ref-right.csv",
+    "f1_turns_limit": "f1sim-ref-turns.csv",
+}
+_reference_cache = {}
+
+
+def load_reference(name):
+    """Read one of the reference CSVs on first use and keep it for later calls."""
+    if name not in _reference_cache:
+        _reference_cache[name] = pd.read_csv(REFERENCE_FILES[name])
+    return _reference_cache[name]
+
+
+def __getattr__(name):
+    # Keeps `from utils.visualization_functions import f1_left_limit` working
+    # without reading any CSV at import time
+    if name in REFERENCE_FILES:
+        return load_reference(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 def plot_racing_line_t1_t2(
     df, left, right,
@@ -16,6 +35,9 @@ def plot_racing_line_t1_t2(
     track_linestyle="--",
     show_apex=True,
     apex_marker="X",
+    render="scatter",
+    cell_size=0.5,
+    agg="mean",
 ):
     """
     Plots racing line from start of Turn 1 to end of Turn 2.
@@ -26,53 +48,81 @@ def plot_racing_line_t1_t2(
     plot_racing_line_t1_t2(f1_cleaned_df, f1_left_limit, f1_right_limit,
                        color_col="exit_T2_speed",
                        lower_limit=240, upper_limit=250)
-    """
 
-    # --- Copy df ---
-    plot_df = df.copy()
+    For large frames use render="raster": points are binned into a grid of
+    cell_size metres and each cell is coloured by the mean ("mean"), maximum
+    ("max") or number ("count") of color_col values falling in it.
 
-    # --- Apply numeric filters ---
-    if lower_limit is not None:
-        plot_df = plot_df[plot_df[color_col] >= lower_limit]
-    if upper_limit is not None:
-        plot_df = plot_df[plot_df[color_col] <= upper_limit]
+    plot_racing_line_t1_t2(f1_cleaned_df, f1_left_limit, f1_right_limit,
+                       color_col="M_SPEED_1", render="raster", agg="max")
 
-    # --- Sort by color to emphasize high values ---
-    if color_col in plot_df:
-        plot_df = plot_df.sort_values(by=color_col)
+    left and right may also be (x, y) pairs from boundary_polyline, so repeated
+    plots skip filtering the boundaries:
 
-    # --- Extract variables ---
-    x = plot_df[x_col]
-    y = plot_df[y_col]
-    colors = plot_df[color_col] if color_col in plot_df else "pink"
+    left_line = boundary_polyline(f1_left_limit, (315, 425), (0, 260))
+    """
+
+    import matplotlib.pyplot as plt
 
     # --- Hardcoded zoom covering Turn 1 → Turn 2 ---
     xlim = (315, 425)  # start of T1 → end of T2
     ylim = (0, 260)    # min/max Y across T1+T2
 
+    # --- Restrict to the T1–T2 window before copying anything ---
+    in_view = df[x_col].between(*xlim) & df[y_col].between(*ylim)
+
+    # --- Apply numeric filters ---
+    if color_col in df:
+        if lower_limit is not None:
+            in_view &= df[color_col] >= lower_limit
+        if upper_limit is not None:
+            in_view &= df[color_col] <= upper_limit
+
     # --- Plot ---
     plt.figure(figsize=(12, 10))
 
     # Track boundaries
+    left_x, left_y = boundary_polyline(left, xlim, ylim)
+    right_x, right_y = boundary_polyline(right, xlim, ylim)
     plt.plot(
-        left[(left["WORLDPOSX"].between(*xlim)) & (left["WORLDPOSY"].between(*ylim))]
-            .sort_values(by="FRAME")["WORLDPOSX"],
-        left[(left["WORLDPOSX"].between(*xlim)) & (left["WORLDPOSY"].between(*ylim))]
-            .sort_values(by="FRAME")["WORLDPOSY"],
+        left_x, left_y,
         linestyle=track_linestyle, color="lightgray", linewidth=1.5, label="Left boundary"
     )
     plt.plot(
-        right[(right["WORLDPOSX"].between(*xlim)) & (right["WORLDPOSY"].between(*ylim))]
-            .sort_values(by="FRAME")["WORLDPOSX"],
-        right[(right["WORLDPOSX"].between(*xlim)) & (right["WORLDPOSY"].between(*ylim))]
-            .sort_values(by="FRAME")["WORLDPOSY"],
+        right_x, right_y,
         linestyle=track_linestyle, color="slategray", linewidth=1.5, label="Right boundary"
     )
 
-    # Racing line
-    sc = plt.scatter(x, y, c=colors, cmap=cmap, s=3, alpha=0.7)
-    if isinstance(colors, pd.Series) and pd.api.types.is_numeric_dtype(colors):
-        plt.colorbar(sc, label=color_col)
+    if render == "raster" and color_col in df:
+        # Racing line as an aggregated image
+        grid, extent = rasterize_points(
+            df.loc[in_view, x_col].to_numpy(),
+            df.loc[in_view, y_col].to_numpy(),
+            df.loc[in_view, color_col].to_numpy(dtype=float),
+            xlim, ylim, cell_size=cell_size, agg=agg,
+        )
+        im = plt.imshow(
+            np.ma.masked_invalid(grid), origin="lower", extent=extent,
+            cmap=cmap, interpolation="nearest", aspect="auto",
+        )
+        plt.colorbar(im, label=f"{color_col} ({agg} per {cell_size} m cell)")
+    else:
+        # --- Copy only the points in view ---
+        plot_df = df.loc[in_view, [x_col, y_col] + ([color_col] if color_col in df else [])]
+
+        # --- Sort by color to emphasize high values ---
+        if color_col in plot_df:
+            plot_df = plot_df.sort_values(by=color_col)
+
+        # --- Extract variables ---
+        x = plot_df[x_col]
+        y = plot_df[y_col]
+        colors = plot_df[color_col] if color_col in plot_df else "pink"
+
+        # Racing line
+        sc = plt.scatter(x, y, c=colors, cmap=cmap, s=3, alpha=0.7)
+        if isinstance(colors, pd.Series) and pd.api.types.is_numeric_dtype(colors):
+            plt.colorbar(sc, label=color_col)
 
     # Optional apex markers (T1 + T2)
     if show_apex:
@@ -97,3 +147,53 @@ def plot_racing_line_t1_t2(
     plt.ylim(*ylim)
     plt.legend()
     plt.show()
+
+
+def boundary_polyline(boundary, xlim, ylim):
+    """
+    Returns the x and y arrays of a track boundary inside the zoom window, ordered by FRAME.
+    When plotting many times, compute this once per boundary and pass the (x, y) pair
+    to plot_racing_line_t1_t2 in place of the boundary dataframe.
+    """
+    if isinstance(boundary, tuple):
+        return boundary
+
+    window = boundary[
+        boundary["WORLDPOSX"].between(*xlim) & boundary["WORLDPOSY"].between(*ylim)
+    ].sort_values(by="FRAME")
+    return window["WORLDPOSX"].to_numpy(), window["WORLDPOSY"].to_numpy()
+
+
+def rasterize_points(x, y, values, xlim, ylim, cell_size=0.5, agg="mean"):
+    """
+    Bins points into a regular grid over xlim/ylim and aggregates values per cell
+    ("mean", "max" or "count"). Empty cells are NaN.
+
+    Returns the (ny, nx) grid and the matching imshow extent.
+    """
+    nx = int(np.ceil((xlim[1] - xlim[0]) / cell_size))
+    ny = int(np.ceil((ylim[1] - ylim[0]) / cell_size))
+
+    ix = np.clip(((x - xlim[0]) / cell_size).astype(np.int64), 0, nx - 1)
+    iy = np.clip(((y - ylim[0]) / cell_size).astype(np.int64), 0, ny - 1)
+    cell = iy * nx + ix
+
+    valid = ~np.isnan(values)
+    cell, values = cell[valid], values[valid]
+
+    counts = np.bincount(cell, minlength=nx * ny).astype(float)
+
+    if agg == "mean":
+        sums = np.bincount(cell, weights=values, minlength=nx * ny)
+        grid = np.divide(sums, counts, out=np.full(nx * ny, np.nan), where=counts > 0)
+    elif agg == "max":
+        grid = np.full(nx * ny, -np.inf)
+        np.maximum.at(grid, cell, values)
+        grid[counts == 0] = np.nan
+    elif agg == "count":
+        grid = np.where(counts > 0, counts, np.nan)
+    else:
+        raise ValueError(f"Unknown raster aggregation: {agg}")
+
+    extent = (xlim[0], xlim[0] + nx * cell_size, ylim[0], ylim[0] + ny * cell_size)
+    return grid.reshape(ny, nx), extent